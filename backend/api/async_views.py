@@ -0,0 +1,62 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.db import close_old_connections
+from django.urls import URLPattern
+
+# Горячие маршруты, которые под ASGI обслуживаются асинхронно.
+ASYNC_ROUTES = ('recipes-list', 'recipes-detail', 'tags-list',
+                'ingredients-list', 'users-me')
+
+# Django 3.2 выполняет синхронные view под ASGI в одном общем потоке.
+# Горячие маршруты уходят в собственный пул: сколько в нем потоков,
+# столько запросов процесс одновременно ждет от базы.
+executor = ThreadPoolExecutor(max_workers=settings.ASYNC_DB_THREADS,
+                              thread_name_prefix='async-db')
+
+
+def call_view(view, request, *args, **kwargs):
+    # Поток пула живет дольше запроса, поэтому соединения с базой
+    # закрываются так же, как по сигналам начала и конца запроса WSGI.
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    run = sync_to_async(call_view, thread_sensitive=False, executor=executor)
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await run(view, request, *args, **kwargs)
+    return wrapper
+
+
+def async_urlpatterns(urlpatterns):
+    return [
+        URLPattern(pattern.pattern, async_view(pattern.callback),
+                   pattern.default_args, pattern.name)
+        if isinstance(pattern, URLPattern) and pattern.name in ASYNC_ROUTES
+        else pattern
+        for pattern in urlpatterns
+    ]
+
+
+class AsyncReadHandler(ASGIHandler):
+    # Подменяет URLconf запроса на вариант с асинхронными маршрутами,
+    # WSGI продолжает работать с обычными синхронными view.
+    urlconf = 'foodgram_backend.asgi_urls'
+
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = self.urlconf
+        return request, error_response
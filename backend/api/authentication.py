@@ -0,0 +1,253 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken, OutstandingToken)
+
+User = get_user_model()
+
+# Поля пользователя, которых хватает правам доступа и сериализаторам,
+# в порядке полей модели, как того требует from_db. Остальные поля
+# догружаются из базы при первом обращении к ним.
+SNAPSHOT_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in ('id', 'email', 'username', 'first_name',
+                         'last_name', 'is_active', 'is_staff',
+                         'is_superuser', 'is_blocked')
+)
+SHARED_PREFIX = 'auth-token:'
+VERSION_PREFIX = 'auth-token-version:'
+
+# Права пользователя, которые JWT переносит в клеймах.
+CLAIM_FIELDS = ('is_active', 'is_staff', 'is_blocked')
+JWT_USER_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in ('id',) + CLAIM_FIELDS
+)
+REVOKED_PREFIX = 'jwt-revoked:'
+
+
+class TokenCache:
+    # Снимки пользователей по ключам токенов. С общим кешем Django
+    # (AUTH_CACHE_ALIAS) они хранятся только в нем, чтобы выход и
+    # блокировка сразу действовали во всех процессах. Без общего кеша
+    # AUTH_CACHE_TTL включает LRU в памяти процесса: его сброс виден только
+    # своему процессу, поэтому он годится лишь для одного процесса.
+    # get возвращает и версию, которую нужно передать в set: снимок,
+    # прочитанный из базы до сброса, записывается со старой версией и
+    # не используется.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+        self._invalidations = 0
+
+    @property
+    def shared(self):
+        if not settings.AUTH_CACHE_ALIAS:
+            return None
+        return caches[settings.AUTH_CACHE_ALIAS]
+
+    def get(self, key):
+        if self.shared is not None:
+            return self._get_shared(key)
+        now = time.monotonic()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                expires, snapshot = item
+                if expires > now:
+                    self._items.move_to_end(key)
+                    return snapshot, self._invalidations
+                del self._items[key]
+            return None, self._invalidations
+
+    def _get_shared(self, key):
+        # Версия токена - время последнего сброса в наносекундах, как у
+        # Generation: вытесненная версия не повторит старое значение.
+        values = self.shared.get_many(
+            [SHARED_PREFIX + key, VERSION_PREFIX + key])
+        version = values.get(VERSION_PREFIX + key)
+        if version is None:
+            version = self.shared.get_or_set(
+                VERSION_PREFIX + key, time.time_ns,
+                settings.AUTH_SHARED_CACHE_TTL)
+        entry = values.get(SHARED_PREFIX + key)
+        if entry is not None and entry[0] == version:
+            return entry[1], version
+        return None, version
+
+    def set(self, key, version, snapshot):
+        if self.shared is not None:
+            self.shared.set(SHARED_PREFIX + key, (version, snapshot),
+                            settings.AUTH_SHARED_CACHE_TTL)
+        elif settings.AUTH_CACHE_TTL:
+            self._store(key, version, snapshot)
+
+    def _store(self, key, version, snapshot):
+        with self._lock:
+            if version != self._invalidations:
+                return
+            self._items[key] = (time.monotonic() + settings.AUTH_CACHE_TTL,
+                                snapshot)
+            self._items.move_to_end(key)
+            while len(self._items) > settings.AUTH_CACHE_SIZE:
+                self._items.popitem(last=False)
+
+    def invalidate(self, keys):
+        keys = list(keys)
+        if not keys:
+            return
+        with self._lock:
+            self._invalidations += 1
+            for key in keys:
+                self._items.pop(key, None)
+        if self.shared is not None:
+            version = time.time_ns()
+            self.shared.set_many(
+                {VERSION_PREFIX + key: version for key in keys},
+                settings.AUTH_SHARED_CACHE_TTL)
+            self.shared.delete_many([SHARED_PREFIX + key for key in keys])
+
+    def invalidate_users(self, user_ids):
+        self.invalidate(Token.objects.filter(
+            user_id__in=user_ids).values_list('key', flat=True))
+
+    def clear(self):
+        with self._lock:
+            self._invalidations += 1
+            self._items.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        snapshot, version = token_cache.get(key)
+        if snapshot is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, version, tuple(
+                getattr(user, field) for field in SNAPSHOT_FIELDS))
+            return user, token
+        user = User.from_db(DEFAULT_DB_ALIAS, SNAPSHOT_FIELDS, snapshot)
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+        return user, Token(key=key, user=user)
+
+
+class RevocationList:
+    # Отозванные access-токены и пользователи, чьи токены выданы до отзыва.
+    # Запись нужна, пока не истечет последний выданный до нее access-токен,
+    # поэтому список короткий и не требует базы данных. Он хранится в
+    # общем кеше (в режиме jwt он обязателен), копия в памяти процесса
+    # лишь экономит обращения к нему.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._items = {}
+
+    @property
+    def shared(self):
+        if not settings.AUTH_CACHE_ALIAS:
+            return None
+        return caches[settings.AUTH_CACHE_ALIAS]
+
+    @property
+    def lifetime(self):
+        return jwt_settings.ACCESS_TOKEN_LIFETIME.total_seconds()
+
+    def revoke(self, items):
+        now = time.monotonic()
+        with self._lock:
+            self._items = {key: item for key, item in self._items.items()
+                           if item[0] > now}
+            for key, value in items.items():
+                self._items[key] = (now + self.lifetime, value)
+        if self.shared is not None:
+            self.shared.set_many(
+                {REVOKED_PREFIX + key: value for key, value in items.items()},
+                int(self.lifetime) + 1
+            )
+
+    def revoke_token(self, token):
+        self.revoke({f'jti:{token[jwt_settings.JTI_CLAIM]}': True})
+
+    def revoke_users(self, user_ids):
+        revoked_at = time.time()
+        self.revoke({f'user:{user_id}': revoked_at for user_id in user_ids})
+
+    def is_revoked(self, token):
+        keys = (f'jti:{token[jwt_settings.JTI_CLAIM]}',
+                f'user:{token[jwt_settings.USER_ID_CLAIM]}')
+        now = time.monotonic()
+        with self._lock:
+            found = {key: self._items[key][1] for key in keys
+                     if key in self._items and self._items[key][0] > now}
+        if self.shared is not None and len(found) < len(keys):
+            found.update({
+                key[len(REVOKED_PREFIX):]: value for key, value in
+                self.shared.get_many(
+                    [REVOKED_PREFIX + key for key in keys]).items()
+            })
+        if keys[0] in found:
+            return True
+        revoked_at = found.get(keys[1])
+        return revoked_at is not None and token['auth_time'] <= revoked_at
+
+
+jwt_revocations = RevocationList()
+
+
+def revoke_jwt(user_ids):
+    # Access-токены отзываются списком, refresh-токены - в черном списке,
+    # так что новые токены по старым refresh-токенам не выдаются.
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    jwt_revocations.revoke_users(user_ids)
+    outstanding = OutstandingToken.objects.filter(
+        user_id__in=user_ids, expires_at__gt=timezone.now(),
+        blacklistedtoken__isnull=True
+    ).values_list('id', flat=True)
+    BlacklistedToken.objects.bulk_create(
+        (BlacklistedToken(token_id=token_id)
+         for token_id in outstanding.iterator()),
+        batch_size=500, ignore_conflicts=True
+    )
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    # Пользователь собирается из клеймов access-токена без запросов к
+    # таблицам пользователей и токенов.
+
+    def get_user(self, validated_token):
+        if 'auth_time' not in validated_token:
+            raise exceptions.AuthenticationFailed(
+                'Токен выдан без данных пользователя.',
+                code='token_not_valid')
+        if jwt_revocations.is_revoked(validated_token):
+            raise exceptions.AuthenticationFailed(
+                'Токен отозван.', code='token_revoked')
+        values = {'id': validated_token[jwt_settings.USER_ID_CLAIM]}
+        values.update((field, validated_token.get(field, False))
+                      for field in CLAIM_FIELDS)
+        user = User.from_db(DEFAULT_DB_ALIAS, JWT_USER_FIELDS, tuple(
+            values[field] for field in JWT_USER_FIELDS))
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+        return user
@@ -0,0 +1,134 @@
+import gzip
+import hashlib
+import re
+import threading
+import time
+from collections import namedtuple
+
+import brotli
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework.renderers import JSONRenderer
+
+from foodgram_backend.constants import CATALOG_MAX_AGE
+from recipes.models import Ingredient, Tag
+from .generations import Generation
+from .serializers import IngredientSerializer, TagSerializer
+
+CatalogEntry = namedtuple(
+    'CatalogEntry',
+    ('data', 'content', 'gzip_content', 'brotli_content', 'etag',
+     'last_modified', 'generation')
+)
+
+ACCEPTS_BROTLI = re.compile(r'\bbr\b')
+ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+
+class Catalog:
+    # Готовый JSON всего справочника со сжатыми копиями. Собирается при
+    # первом запросе и пересобирается, когда сигналы модели в любом
+    # процессе сменят поколение в общем кеше. Без общего кеша
+    # (CATALOG_CACHE_ALIAS) копия не хранится. Данные берутся из основной
+    # базы, а не с реплики.
+
+    def __init__(self, name, get_data):
+        self._get_data = get_data
+        self._name = f'catalog:{name}'
+        self._lock = threading.Lock()
+        self._entry = None
+
+    def _build(self, generation):
+        data = self._get_data()
+        content = JSONRenderer().render(data)
+        return CatalogEntry(
+            data=data,
+            content=content,
+            gzip_content=gzip.compress(content, mtime=0),
+            brotli_content=brotli.compress(content),
+            etag=hashlib.sha256(content).hexdigest(),
+            last_modified=http_date(Generation.timestamp(generation)),
+            generation=generation,
+        )
+
+    @property
+    def enabled(self):
+        return bool(settings.CATALOG_CACHE_ALIAS)
+
+    def _generation(self):
+        return Generation(self._name, settings.CATALOG_CACHE_ALIAS)
+
+    def get(self):
+        if not self.enabled:
+            return self._build(time.time_ns())
+        # Поколение читается до сборки: данные не старее своего номера.
+        generation = self._generation().get()
+        entry = self._entry
+        if entry is None or entry.generation != generation:
+            with self._lock:
+                if (self._entry is None
+                        or self._entry.generation != generation):
+                    self._entry = self._build(generation)
+                entry = self._entry
+        return entry
+
+    def invalidate(self):
+        self._entry = None
+        if self.enabled:
+            self._generation().bump()
+
+    def response(self, request):
+        entry = self.get()
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if ACCEPTS_BROTLI.search(accept_encoding):
+            content, encoding = entry.brotli_content, 'br'
+            etag = f'"{entry.etag}-br"'
+        elif ACCEPTS_GZIP.search(accept_encoding):
+            content, encoding = entry.gzip_content, 'gzip'
+            etag = f'"{entry.etag}-gzip"'
+        else:
+            content, encoding = entry.content, None
+            etag = f'"{entry.etag}"'
+
+        if self._not_modified(request, entry):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type='application/json')
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['ETag'] = etag
+        response['Last-Modified'] = entry.last_modified
+        response['Cache-Control'] = f'public, max-age={CATALOG_MAX_AGE}'
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    def _not_modified(self, request, entry):
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if if_none_match:
+            etags = parse_etags(if_none_match)
+            # Прокси, сжимающие ответ сами, ослабляют ETag до W/"...".
+            return '*' in etags or any(
+                etag.removeprefix('W/').strip('"').startswith(entry.etag)
+                for etag in etags
+            )
+        if_modified_since = parse_http_date_safe(
+            request.META.get('HTTP_IF_MODIFIED_SINCE', '')
+        )
+        return (
+            if_modified_since is not None
+            and if_modified_since >= parse_http_date_safe(entry.last_modified)
+        )
+
+
+tag_catalog = Catalog(
+    'tags',
+    lambda: TagSerializer(Tag.objects.using(DEFAULT_DB_ALIAS), many=True).data
+)
+ingredient_catalog = Catalog(
+    'ingredients',
+    lambda: IngredientSerializer(
+        Ingredient.objects.using(DEFAULT_DB_ALIAS), many=True).data
+)
@@ -1,20 +1,45 @@
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
 
 from recipes.models import Recipe
+from recipes.search import search_recipes
 
 
 class RecipeFilter(filters.FilterSet):
-    tags = filters.CharFilter(field_name='tags__slug',
-                              lookup_expr='iexact')
+    tags = filters.CharFilter(method='filter_tags')
+    search = filters.CharFilter(method='filter_search')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'Сначала популярные'),
+                 ('new', 'Сначала новые')),
+        method='filter_ordering'
+    )
 
     class Meta:
         model = Recipe
-        fields = ('author', 'name', 'tags',
-                  'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'name', 'tags', 'search',
+                  'is_favorited', 'is_in_shopping_cart', 'ordering')
+
+    def filter_tags(self, queryset, name, value):
+        # Слаги сопоставляются с тегами внутри EXISTS, а не по копии
+        # справочника в памяти, которая может отставать от базы.
+        return queryset.filter(Exists(
+            Recipe.tags.through.objects.filter(
+                recipe_id=OuterRef('id'),
+                tag__slug__in=self.data.getlist(name)
+            )
+        ))
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
+
+    def filter_ordering(self, queryset, name, value):
+        if value == 'popular':
+            return queryset.order_by('-favorites_count', '-id')
+        return queryset.order_by('-id')
 
     def filter_is_favorited(self, queryset, name, value):
         if value:
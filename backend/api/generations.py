@@ -0,0 +1,28 @@
+import time
+
+from django.core.cache import caches
+
+
+class Generation:
+    # Номер версии данных в общем кеше Django. Процессы держат у себя
+    # копии, собранные при известном номере, и пересобирают их, когда
+    # другой процесс сменит номер. Номер - время изменения в наносекундах,
+    # поэтому вытесненный из кеша ключ не повторит старое значение.
+
+    def __init__(self, name, alias='default'):
+        self.key = f'generation:{name}'
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def get(self):
+        return self.cache.get_or_set(self.key, time.time_ns, None)
+
+    def bump(self):
+        self.cache.set(self.key, time.time_ns(), None)
+
+    @staticmethod
+    def timestamp(generation):
+        return generation // 10 ** 9
@@ -0,0 +1,87 @@
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import Case, IntegerField, Value, When
+
+from recipes.models import Ingredient
+from .generations import Generation
+
+
+class IngredientIndex:
+    # Отсортированный по имени массив ингредиентов в памяти процесса.
+    # Строится при первом обращении и пересобирается, когда сигналы
+    # модели в любом процессе сменят поколение в общем кеше.
+    # Читается из основной базы: отстающая реплика закрепила бы в памяти
+    # устаревшие данные до следующего изменения. Без общего кеша
+    # (CATALOG_CACHE_ALIAS) поиск идет запросом к базе.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = None
+
+    def _build(self, generation):
+        ingredients = Ingredient.objects.using(DEFAULT_DB_ALIAS).values(
+            'id', 'name', 'measurement_unit'
+        )
+        entries = sorted(
+            (ingredient['name'].casefold(), ingredient)
+            for ingredient in ingredients
+        )
+        return ([key for key, _ in entries], [item for _, item in entries],
+                generation)
+
+    @property
+    def enabled(self):
+        return bool(settings.CATALOG_CACHE_ALIAS)
+
+    def _generation(self):
+        return Generation('ingredient-index', settings.CATALOG_CACHE_ALIAS)
+
+    def _get_entries(self):
+        generation = self._generation().get()
+        entries = self._entries
+        if entries is None or entries[2] != generation:
+            with self._lock:
+                if self._entries is None or self._entries[2] != generation:
+                    self._entries = self._build(generation)
+                entries = self._entries
+        return entries
+
+    def invalidate(self):
+        self._entries = None
+        if self.enabled:
+            self._generation().bump()
+
+    def _search_database(self, query):
+        return list(
+            Ingredient.objects.filter(name__icontains=query).annotate(
+                prefix=Case(
+                    When(name__istartswith=query, then=Value(0)),
+                    default=Value(1),
+                    output_field=IntegerField(),
+                )
+            ).order_by('prefix', 'name').values(
+                'id', 'name', 'measurement_unit'
+            )
+        )
+
+    def search(self, query):
+        if not self.enabled:
+            return self._search_database(query.strip())
+        keys, items, _ = self._get_entries()
+        query = query.strip().casefold()
+        start = bisect_left(keys, query)
+        end = start
+        while end < len(keys) and keys[end].startswith(query):
+            end += 1
+        result = items[start:end]
+        result.extend(
+            item for key, item in zip(keys, items)
+            if query in key and not key.startswith(query)
+        )
+        return result
+
+
+ingredient_index = IngredientIndex()
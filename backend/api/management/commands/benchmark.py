@@ -0,0 +1,350 @@
+import base64
+import io
+import json
+import statistics
+import time
+from collections import namedtuple
+from itertools import cycle
+from tempfile import TemporaryDirectory
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import (CaptureQueriesContext, override_settings,
+                               setup_test_environment,
+                               teardown_test_environment)
+from django.utils import timezone
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                            Tag)
+from users.models import Subscription
+
+User = get_user_model()
+
+# Бюджет эндпоинта: максимум SQL-запросов на вызов и p95 в миллисекундах.
+Endpoint = namedtuple('Endpoint', ('name', 'max_queries', 'max_p95_ms',
+                                   'call'))
+
+CART_SIZE = 30
+BENCHMARK_PASSWORD = 'benchmarkpassword'
+
+# Тестовая база создается только для default, поэтому роутер реплик
+# отключается. Замер идет в одном процессе, и кеш в его памяти заменяет
+# общий кеш боевой конфигурации.
+BENCHMARK_SETTINGS = {
+    'DATABASE_ROUTERS': [],
+    'AUTH_CACHE_ALIAS': 'default',
+    'RECIPE_PAGE_CACHE_ALIAS': 'default',
+    'CATALOG_CACHE_ALIAS': 'default',
+    'PASSWORD_HASHERS': ['django.contrib.auth.hashers.MD5PasswordHasher'],
+}
+
+
+def make_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (600, 400), '#39FF14').save(buffer, 'JPEG')
+    return ('data:image/jpeg;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+def consume(response):
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+def toggle(client, url):
+    return client.post(url), client.delete(url)
+
+
+class Command(BaseCommand):
+    help = ('Seed a test database and measure latency and SQL queries '
+            'of every API endpoint against budgets')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=300)
+        parser.add_argument('--recipes', type=int, default=3000)
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--latency-factor', type=float, default=1.0,
+            help='Множитель бюджетов p95 для медленных машин'
+        )
+        parser.add_argument('--output', default='benchmark.json')
+        parser.add_argument(
+            '--compare', default=None,
+            help='JSON предыдущего запуска для сравнения'
+        )
+        parser.add_argument(
+            '--only', default=None,
+            help='Запускать только эндпоинты, содержащие эту строку'
+        )
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            with TemporaryDirectory() as media_root, override_settings(
+                MEDIA_ROOT=media_root, **BENCHMARK_SETTINGS
+            ):
+                self.seed(options)
+                results = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+        self.report(results, options)
+
+    def seed(self, options):
+        call_command('load_test_data', scale=True, users=options['users'],
+                     recipes=options['recipes'], seed=options['seed'],
+                     stdout=io.StringIO())
+        self.user = User.objects.annotate(
+            subscriptions=Count('follower')
+        ).order_by('-subscriptions').first()
+        self.user.set_password(BENCHMARK_PASSWORD)
+        self.user.save()
+        popular = list(Recipe.objects.order_by(
+            '-favorites_count').values_list('id', flat=True)[:CART_SIZE])
+        for model in (Favorite, ShoppingCart):
+            model.objects.bulk_create(
+                (model(user=self.user, recipe_id=recipe_id)
+                 for recipe_id in popular),
+                ignore_conflicts=True
+            )
+        # Вход по токену и JWT идут от других пользователей: смена пароля
+        # self.user отзывает его JWT.
+        self.login_user, self.jwt_user = User.objects.exclude(
+            id=self.user.id).order_by('id')[:2]
+        for user in (self.login_user, self.jwt_user):
+            user.set_password(BENCHMARK_PASSWORD)
+            user.save()
+        self.dataset = {
+            'users': User.objects.count(),
+            'recipes': Recipe.objects.count(),
+            'ingredients': Ingredient.objects.count(),
+            'tags': Tag.objects.count(),
+            'subscriptions': Subscription.objects.count(),
+            'favorites': Favorite.objects.count(),
+            'shopping_carts': ShoppingCart.objects.count(),
+        }
+
+    def endpoints(self):
+        anonymous = APIClient()
+        client = APIClient()
+        token, _ = Token.objects.get_or_create(user=self.user)
+        client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        login_client = APIClient()
+
+        # Переключатели избранного и корзины начинают с POST, поэтому
+        # рецепт не должен уже лежать в них после наполнения базы.
+        recipe = Recipe.objects.exclude(author=self.user).exclude(
+            favorite_recipe__user=self.user).exclude(
+            shopping_recipe__user=self.user).first()
+        author = User.objects.exclude(id=self.user.id).exclude(
+            following__user=self.user).values_list('id', flat=True).first()
+        tags = list(Tag.objects.values_list('id', 'slug')[:2])
+        tags_query = '&'.join(f'tags={slug}' for _, slug in tags)
+        ingredient_ids = list(
+            Ingredient.objects.values_list('id', flat=True)[:10])
+        last_page = Recipe.objects.count() // 6
+        image = make_image()
+        recipe_data = {
+            'ingredients': [{'id': ingredient_id, 'amount': 10}
+                            for ingredient_id in ingredient_ids],
+            'tags': [tag_id for tag_id, _ in tags],
+            'image': image,
+            'name': 'Рецепт бенчмарка',
+            'text': 'Описание рецепта бенчмарка',
+            'cooking_time': 15,
+        }
+        own_recipe = client.post('/api/recipes/', recipe_data,
+                                 format='json').json()['id']
+        names = cycle(('Рецепт бенчмарка', 'Рецепт бенчмарка 2'))
+
+        def login_logout():
+            response = login_client.post('/api/auth/token/login/', {
+                'email': self.login_user.email,
+                'password': BENCHMARK_PASSWORD,
+            })
+            login_client.credentials(
+                HTTP_AUTHORIZATION=f'Token {response.json()["auth_token"]}')
+            response = login_client.post('/api/auth/token/logout/')
+            login_client.credentials()
+            return response
+
+        endpoints = (
+            Endpoint('recipes: list, anonymous', 0, 20,
+                     lambda: anonymous.get('/api/recipes/')),
+            Endpoint('recipes: list', 5, 60,
+                     lambda: client.get('/api/recipes/')),
+            Endpoint('recipes: list, limit=50', 5, 250,
+                     lambda: client.get('/api/recipes/?limit=50')),
+            Endpoint('recipes: list, last page', 5, 80,
+                     lambda: client.get(f'/api/recipes/?page={last_page}')),
+            Endpoint('recipes: list, cursor', 4, 60,
+                     lambda: client.get('/api/recipes/?pagination=cursor')),
+            Endpoint('recipes: filter tags', 5, 80,
+                     lambda: client.get(f'/api/recipes/?{tags_query}')),
+            Endpoint('recipes: filter author', 6, 60,
+                     lambda: client.get(
+                         f'/api/recipes/?author={recipe.author_id}')),
+            Endpoint('recipes: filter is_favorited', 5, 60,
+                     lambda: client.get('/api/recipes/?is_favorited=1')),
+            Endpoint('recipes: filter is_in_shopping_cart', 5, 60,
+                     lambda: client.get(
+                         '/api/recipes/?is_in_shopping_cart=1')),
+            Endpoint('recipes: search', 5, 150,
+                     lambda: client.get('/api/recipes/?search=рецепт')),
+            Endpoint('recipes: popular', 5, 60,
+                     lambda: client.get('/api/recipes/?ordering=popular')),
+            Endpoint('recipes: detail', 4, 40,
+                     lambda: client.get(f'/api/recipes/{recipe.id}/')),
+            Endpoint('recipes: create', 15, 60,
+                     lambda: client.post('/api/recipes/', recipe_data,
+                                         format='json')),
+            Endpoint('recipes: update name', 8, 60,
+                     lambda: client.patch(f'/api/recipes/{own_recipe}/',
+                                          {'name': next(names)},
+                                          format='json')),
+            Endpoint('recipes: favorite toggle', 10, 60,
+                     lambda: toggle(
+                         client, f'/api/recipes/{recipe.id}/favorite/')[0]),
+            Endpoint('recipes: shopping cart toggle', 5, 60,
+                     lambda: toggle(
+                         client,
+                         f'/api/recipes/{recipe.id}/shopping_cart/')[0]),
+            Endpoint('recipes: download shopping cart', 1, 60,
+                     lambda: client.get(
+                         '/api/recipes/download_shopping_cart/')),
+            Endpoint('tags: list', 0, 20,
+                     lambda: client.get('/api/tags/')),
+            Endpoint('tags: detail', 1, 20,
+                     lambda: client.get(f'/api/tags/{tags[0][0]}/')),
+            Endpoint('ingredients: list', 0, 20,
+                     lambda: client.get('/api/ingredients/')),
+            Endpoint('ingredients: search', 0, 20,
+                     lambda: client.get('/api/ingredients/?name=со')),
+            Endpoint('ingredients: detail', 1, 20,
+                     lambda: client.get(
+                         f'/api/ingredients/{ingredient_ids[0]}/')),
+            Endpoint('users: list', 3, 60,
+                     lambda: client.get('/api/users/')),
+            Endpoint('users: detail', 2, 40,
+                     lambda: client.get(f'/api/users/{author}/')),
+            Endpoint('users: me', 1, 40,
+                     lambda: client.get('/api/users/me/')),
+            Endpoint('users: subscriptions', 4, 80,
+                     lambda: client.get('/api/users/subscriptions/')),
+            Endpoint('users: subscriptions, recipes_limit=10', 4, 80,
+                     lambda: client.get(
+                         '/api/users/subscriptions/?recipes_limit=10')),
+            Endpoint('users: subscribe toggle', 11, 80,
+                     lambda: toggle(
+                         client, f'/api/users/{author}/subscribe/')[0]),
+            # В режиме jwt смена пароля еще и отзывает токены пользователя.
+            Endpoint('users: set password',
+                     6 if settings.AUTH_MODE == 'jwt' else 3, 60,
+                     lambda: client.post('/api/users/set_password/', {
+                         'current_password': BENCHMARK_PASSWORD,
+                         'new_password': BENCHMARK_PASSWORD,
+                     })),
+            Endpoint('auth: token login and logout', 8, 80, login_logout),
+        )
+        if settings.AUTH_MODE != 'jwt':
+            return endpoints
+
+        jwt_client = APIClient()
+        tokens = jwt_client.post('/api/auth/jwt/create/', {
+            'email': self.jwt_user.email,
+            'password': BENCHMARK_PASSWORD,
+        }).json()
+        jwt_client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+
+        def jwt_refresh():
+            response = login_client.post('/api/auth/jwt/refresh/',
+                                         {'refresh': tokens['refresh']})
+            tokens['refresh'] = response.json()['refresh']
+            return response
+
+        return endpoints + (
+            Endpoint('jwt: recipes list', 5, 60,
+                     lambda: jwt_client.get('/api/recipes/')),
+            Endpoint('jwt: tags list', 0, 20,
+                     lambda: jwt_client.get('/api/tags/')),
+            Endpoint('jwt: users me', 2, 40,
+                     lambda: jwt_client.get('/api/users/me/')),
+            Endpoint('jwt: refresh', 7, 60, jwt_refresh),
+        )
+
+    def run(self, options):
+        results = {}
+        for endpoint in self.endpoints():
+            if options['only'] and options['only'] not in endpoint.name:
+                continue
+            for _ in range(options['warmup']):
+                consume(endpoint.call())
+            timings = []
+            queries = 0
+            for _ in range(options['iterations']):
+                with CaptureQueriesContext(connection) as context:
+                    start = time.perf_counter()
+                    response = consume(endpoint.call())
+                    timings.append((time.perf_counter() - start) * 1000)
+                if response.status_code >= 400:
+                    raise CommandError(
+                        f'{endpoint.name}: HTTP {response.status_code}')
+                queries = max(queries, len(context.captured_queries))
+            timings.sort()
+            max_p95_ms = endpoint.max_p95_ms * options['latency_factor']
+            p95 = timings[max(int(len(timings) * 0.95) - 1, 0)]
+            results[endpoint.name] = {
+                'p50_ms': round(statistics.median(timings), 2),
+                'p95_ms': round(p95, 2),
+                'mean_ms': round(statistics.mean(timings), 2),
+                'queries': queries,
+                'max_queries': endpoint.max_queries,
+                'max_p95_ms': max_p95_ms,
+                'passed': (queries <= endpoint.max_queries
+                           and p95 <= max_p95_ms),
+            }
+        return results
+
+    def report(self, results, options):
+        previous = {}
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as file:
+                previous = json.load(file)['results']
+        for name, result in results.items():
+            line = (f"{name:<42} p50 {result['p50_ms']:>8.2f} ms  "
+                    f"p95 {result['p95_ms']:>8.2f} ms  "
+                    f"queries {result['queries']:>3}")
+            if name in previous:
+                line += (f"  (p95 {previous[name]['p95_ms']:.2f} ms, "
+                         f"queries {previous[name]['queries']})")
+            style = self.style.SUCCESS if result['passed'] else (
+                self.style.ERROR)
+            self.stdout.write(style(line))
+
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump({
+                'created': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'dataset': self.dataset,
+                'iterations': options['iterations'],
+                'results': results,
+            }, file, ensure_ascii=False, indent=2)
+        self.stdout.write(f'[!] Результаты записаны в {options["output"]}')
+
+        failed = [name for name, result in results.items()
+                  if not result['passed']]
+        if failed:
+            raise CommandError(
+                'Превышен бюджет: ' + ', '.join(failed))
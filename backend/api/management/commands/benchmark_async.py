@@ -0,0 +1,172 @@
+import asyncio
+import json
+import statistics
+import time
+from itertools import cycle, islice
+
+from django.core.management.base import CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.async_views import AsyncReadHandler
+from recipes.models import Ingredient, Recipe
+from .benchmark import Command as BenchmarkCommand
+
+
+class SlowQueries:
+    # Задержка перед каждым SQL-запросом имитирует сетевую базу данных.
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def __call__(self, execute, sql, params, many, context):
+        time.sleep(self.latency)
+        return execute(sql, params, many, context)
+
+    def install(self, sender=None, connection=None, **kwargs):
+        for wrapper in [connection] if connection else connections.all():
+            if self not in wrapper.execute_wrappers:
+                wrapper.execute_wrappers.append(self)
+
+    def __enter__(self):
+        self.install()
+        connection_created.connect(self.install)
+        return self
+
+    def __exit__(self, *args):
+        connection_created.disconnect(self.install)
+        for connection in connections.all():
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+
+async def asgi_get(application, path, headers):
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': 'GET',
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query.encode(),
+        'root_path': '',
+        'headers': [(b'host', b'testserver')] + headers,
+        'client': ('127.0.0.1', 0),
+        'server': ('testserver', 80),
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    await application(scope, receive, send)
+    return messages[0]['status']
+
+
+def summary(timings, total):
+    timings = sorted(timings)
+    return {
+        'requests_per_second': round(len(timings) / total, 2),
+        'p50_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(timings[max(int(len(timings) * 0.95) - 1, 0)], 2),
+    }
+
+
+class Command(BenchmarkCommand):
+    help = ('Compare throughput of one WSGI worker and one ASGI process '
+            'on the hot read endpoints with a slow database')
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            '--db-latency', type=float, default=10,
+            help='Задержка каждого SQL-запроса в миллисекундах'
+        )
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument(
+            '--min-speedup', type=float, default=2.0,
+            help='Минимальный выигрыш ASGI по запросам в секунду'
+        )
+        parser.set_defaults(users=100, recipes=1000,
+                            output='benchmark_async.json')
+
+    def paths(self):
+        recipe_id = Recipe.objects.values_list('id', flat=True).first()
+        ingredient = Ingredient.objects.values_list('name', flat=True).first()
+        return ('/api/recipes/', f'/api/recipes/{recipe_id}/',
+                f'/api/ingredients/?name={ingredient[:2]}', '/api/tags/',
+                '/api/users/me/')
+
+    def run(self, options):
+        token, _ = Token.objects.get_or_create(user=self.user)
+        paths = list(islice(cycle(self.paths()), options['requests']))
+        results = {}
+        with SlowQueries(options['db_latency'] / 1000):
+            client = APIClient()
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+            timings = []
+            start = time.perf_counter()
+            for path in paths:
+                request_start = time.perf_counter()
+                response = client.get(path)
+                timings.append((time.perf_counter() - request_start) * 1000)
+                self.check_status(path, response.status_code)
+            results['wsgi'] = summary(timings, time.perf_counter() - start)
+            results['asgi'] = asyncio.run(self.run_asgi(
+                paths, token.key, options['concurrency']))
+        return results
+
+    async def run_asgi(self, paths, key, concurrency):
+        application = AsyncReadHandler()
+        headers = [(b'authorization', f'Token {key}'.encode())]
+        semaphore = asyncio.Semaphore(concurrency)
+        timings = []
+
+        async def fetch(path):
+            async with semaphore:
+                request_start = time.perf_counter()
+                status = await asgi_get(application, path, headers)
+                timings.append((time.perf_counter() - request_start) * 1000)
+                self.check_status(path, status)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(fetch(path) for path in paths))
+        return summary(timings, time.perf_counter() - start)
+
+    def check_status(self, path, status):
+        if status >= 400:
+            raise CommandError(f'{path}: HTTP {status}')
+
+    def report(self, results, options):
+        for mode, result in results.items():
+            self.stdout.write(
+                f"{mode:<5} {result['requests_per_second']:>8.2f} req/s  "
+                f"p50 {result['p50_ms']:>8.2f} ms  "
+                f"p95 {result['p95_ms']:>8.2f} ms"
+            )
+        speedup = (results['asgi']['requests_per_second']
+                   / results['wsgi']['requests_per_second'])
+        self.stdout.write(f'[!] ASGI быстрее в {speedup:.1f} раза')
+        with open(options['output'], 'w', encoding='utf-8') as file:
+            json.dump({
+                'created': timezone.now().isoformat(),
+                'dataset': self.dataset,
+                'db_latency_ms': options['db_latency'],
+                'concurrency': options['concurrency'],
+                'requests': options['requests'],
+                'results': results,
+                'speedup': round(speedup, 2),
+            }, file, ensure_ascii=False, indent=2)
+        self.stdout.write(f'[!] Результаты записаны в {options["output"]}')
+        if speedup < options['min_speedup']:
+            raise CommandError(
+                f'Выигрыш ASGI {speedup:.1f} меньше {options["min_speedup"]}')
@@ -0,0 +1,284 @@
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+
+METRICS = {
+    'foodgram_http_requests_total': (
+        'counter', 'Количество HTTP-запросов'),
+    'foodgram_http_request_duration_seconds': (
+        'histogram', 'Время обработки HTTP-запроса'),
+    'foodgram_http_response_bytes_total': (
+        'counter', 'Объем тел ответов в байтах'),
+    'foodgram_db_queries_total': (
+        'counter', 'Количество SQL-запросов'),
+    'foodgram_db_query_duration_seconds_total': (
+        'counter', 'Суммарное время SQL-запросов'),
+}
+
+
+def process_exists(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsStore:
+    # Метрики процесса копятся в памяти и периодически сбрасываются в
+    # отдельный файл в METRICS_DIR. Эндпоинт метрик суммирует файлы всех
+    # воркеров gunicorn, поэтому процессам не нужна общая память. Файл
+    # удаляется при выходе процесса, а файлы убитых процессов - при
+    # сборе метрик, так что перезапуски воркеров не копят файлы.
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._last_flush = 0.0
+        self._path = None
+        self._pid = None
+
+    @property
+    def path(self):
+        # После fork (gunicorn --preload) у воркера свой файл.
+        if self._path is None or self._pid != os.getpid():
+            os.makedirs(settings.METRICS_DIR, exist_ok=True)
+            self._pid = os.getpid()
+            self._path = os.path.join(
+                settings.METRICS_DIR,
+                f'{self._pid}-{uuid.uuid4().hex}.json'
+            )
+            atexit.register(self._remove, self._path, self._pid)
+        return self._path
+
+    @staticmethod
+    def _remove(path, pid):
+        # Обработчик atexit наследуется при fork, но файл чужой.
+        if pid != os.getpid():
+            return
+        for file_path in (path, f'{path}.tmp'):
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+
+    def inc(self, name, labels, value=1):
+        with self._lock:
+            self._counters[name, labels] += value
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            histogram = self._histograms.setdefault(
+                (name, labels), [[0] * len(LATENCY_BUCKETS), 0.0, 0]
+            )
+            index = bisect_left(LATENCY_BUCKETS, value)
+            if index < len(LATENCY_BUCKETS):
+                histogram[0][index] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_flush < (
+                settings.METRICS_FLUSH_INTERVAL):
+            return
+        with self._lock:
+            self._last_flush = now
+            data = {
+                'counters': [[name, list(labels), value] for
+                             (name, labels), value in self._counters.items()],
+                'histograms': [[name, list(labels), *histogram] for
+                               (name, labels), histogram in
+                               self._histograms.items()],
+            }
+        temporary_path = f'{self.path}.tmp'
+        with open(temporary_path, 'w', encoding='utf-8') as file:
+            json.dump(data, file)
+        os.replace(temporary_path, self.path)
+
+    def collect(self):
+        self.flush(force=True)
+        counters = defaultdict(float)
+        histograms = {}
+        for file_name in os.listdir(settings.METRICS_DIR):
+            if not file_name.endswith('.json'):
+                continue
+            path = os.path.join(settings.METRICS_DIR, file_name)
+            pid = file_name.partition('-')[0]
+            if pid.isdigit() and not process_exists(int(pid)):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            try:
+                with open(path, encoding='utf-8') as file:
+                    data = json.load(file)
+            except (OSError, ValueError):
+                continue
+            for name, labels, value in data['counters']:
+                counters[name, tuple(map(tuple, labels))] += value
+            for name, labels, buckets, total, count in data['histograms']:
+                key = (name, tuple(map(tuple, labels)))
+                histogram = histograms.setdefault(
+                    key, [[0] * len(LATENCY_BUCKETS), 0.0, 0])
+                histogram[0] = [a + b for a, b in zip(histogram[0], buckets)]
+                histogram[1] += total
+                histogram[2] += count
+        return counters, histograms
+
+    def render(self):
+        counters, histograms = self.collect()
+        lines = []
+        for name, (kind, description) in METRICS.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{format_labels(labels)} {value}')
+            for (metric, labels), histogram in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                buckets, total, count = histogram
+                cumulative = 0
+                for bound, bucket in zip(LATENCY_BUCKETS, buckets):
+                    cumulative += bucket
+                    lines.append(f'{name}_bucket'
+                                 f'{format_labels(labels, le=bound)} '
+                                 f'{cumulative}')
+                lines.append(f'{name}_bucket'
+                             f'{format_labels(labels, le="+Inf")} {count}')
+                lines.append(f'{name}_sum{format_labels(labels)} {total}')
+                lines.append(f'{name}_count{format_labels(labels)} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"')
+         .replace('\n', '\\n'))
+        for key, value in pairs
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+metrics_store = MetricsStore()
+
+
+class QueryTracker:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+# Счетчик SQL-запросов асинхронного запроса: view выполняется в пуле
+# потоков, и execute_wrapper соединений потока запроса их не видит.
+query_tracker = ContextVar('query_tracker', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    tracker = query_tracker.get()
+    if tracker is None:
+        return execute(sql, params, many, context)
+    return tracker(execute, sql, params, many, context)
+
+
+@receiver(connection_created)
+def install_query_counter(sender, connection, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        tracker = QueryTracker()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(tracker))
+            response = self.get_response(request)
+        self.record(request, response, tracker, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        tracker = QueryTracker()
+        token = query_tracker.set(tracker)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            query_tracker.reset(token)
+        self.record(request, response, tracker, time.perf_counter() - start)
+        return response
+
+    def record(self, request, response, tracker, duration):
+        view, action = getattr(request, 'metrics_view',
+                               ('unresolved', 'unresolved'))
+        labels = (('view', view), ('action', action))
+        metrics_store.inc('foodgram_http_requests_total', labels + (
+            ('method', request.method),
+            ('status', str(response.status_code)),
+        ))
+        metrics_store.observe('foodgram_http_request_duration_seconds',
+                              labels, duration)
+        metrics_store.inc('foodgram_db_queries_total', labels, tracker.count)
+        metrics_store.inc('foodgram_db_query_duration_seconds_total',
+                          labels, tracker.duration)
+        if not response.streaming:
+            metrics_store.inc('foodgram_http_response_bytes_total', labels,
+                              len(response.content))
+        metrics_store.flush()
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        if view_class is None:
+            request.metrics_view = (
+                f'{view_func.__module__}.{view_func.__name__}', '')
+            return None
+        actions = getattr(view_func, 'actions', None) or {}
+        request.metrics_view = (
+            view_class.__name__,
+            actions.get(request.method.lower(), request.method.lower())
+        )
+        return None
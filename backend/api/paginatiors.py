@@ -1,4 +1,5 @@
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination, PageNumberPagination
 
 from foodgram_backend.constants import PAGE_SIZE
 
@@ -6,3 +7,39 @@ from foodgram_backend.constants import PAGE_SIZE
 class ResponsePaginator(PageNumberPagination):
     page_size = PAGE_SIZE
     page_size_query_param = 'limit'
+
+
+class RecipeCursorPaginator(CursorPagination):
+    page_size = PAGE_SIZE
+    page_size_query_param = 'limit'
+    ordering = '-id'
+
+
+class RecipePaginator(ResponsePaginator):
+    # ?pagination=cursor включает постраничный вывод по курсору без
+    # COUNT(*) и OFFSET, по умолчанию остаются limit/page. Курсор идет
+    # только по -id: сортировки по популярности и релевантности поиска
+    # он молча заменил бы своей, поэтому такие запросы отклоняются.
+    mode_query_param = 'pagination'
+    cursor_paginator_class = RecipeCursorPaginator
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_paginator = None
+        if request.query_params.get(self.mode_query_param) == 'cursor':
+            ordering = (tuple(queryset.query.order_by)
+                        or tuple(queryset.model._meta.ordering))
+            if ordering != (self.cursor_paginator_class.ordering,):
+                raise ValidationError({self.mode_query_param: [
+                    'Постраничный вывод по курсору не поддерживает '
+                    'сортировку по популярности и поиск.'
+                ]})
+            self.cursor_paginator = self.cursor_paginator_class()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
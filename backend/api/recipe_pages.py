@@ -0,0 +1,70 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.permissions import SAFE_METHODS
+
+from .generations import Generation
+
+# Параметры, от которых зависит страница для анонима. Запросы с другими
+# параметрами (поиск, курсор, формат) в кеш не попадают.
+CACHED_PARAMS = frozenset(('page', 'limit', 'tags', 'author', 'ordering'))
+PAGES_GENERATION = 'recipe-pages'
+POPULAR_GENERATION = 'recipe-pages:popular'
+
+
+class RecipePageCache:
+    # Данные страниц списка рецептов для анонимов. В ключ входит поколение
+    # каталога: изменение рецептов, ингредиентов, тегов или авторов меняет
+    # его, а записи прошлых поколений истекают через RECIPE_PAGE_CACHE_TTL.
+    # Порядок ordering=popular зависит еще и от поколения избранного.
+    # Страницы кешируются только в общем кеше: поколение в памяти одного
+    # процесса не узнало бы об изменениях из других.
+
+    @property
+    def alias(self):
+        return settings.RECIPE_PAGE_CACHE_ALIAS
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def generation(self, name):
+        return Generation(name, self.alias)
+
+    def invalidate(self):
+        if self.alias:
+            self.generation(PAGES_GENERATION).bump()
+
+    def invalidate_popular(self):
+        if self.alias:
+            self.generation(POPULAR_GENERATION).bump()
+
+    def key(self, request):
+        if (not self.alias or not settings.RECIPE_PAGE_CACHE_TTL
+                or request.method not in SAFE_METHODS
+                or request.user.is_authenticated
+                or not CACHED_PARAMS.issuperset(request.query_params)):
+            return None
+        generation = self.generation(PAGES_GENERATION).get()
+        if 'popular' in request.query_params.getlist('ordering'):
+            popular = self.generation(POPULAR_GENERATION).get()
+            generation = f'{generation}-{popular}'
+        query = urlencode(sorted(
+            (name, value) for name, values in request.query_params.lists()
+            for value in values
+        ))
+        # Ссылки на страницы и картинки в ответе абсолютные.
+        url = f'{request.scheme}://{request.get_host()}/?{query}'
+        return (f'recipe-pages:{generation}:'
+                f'{hashlib.md5(url.encode()).hexdigest()}')
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, data):
+        self.cache.set(key, data, settings.RECIPE_PAGE_CACHE_TTL)
+
+
+recipe_pages = RecipePageCache()
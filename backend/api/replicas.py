@@ -0,0 +1,71 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from rest_framework.permissions import SAFE_METHODS
+
+PIN_PREFIX = 'db-pin:'
+
+# Реплика, с которой читает текущий запрос, и признак записи в запросе.
+read_alias = ContextVar('read_alias', default=None)
+wrote = ContextVar('wrote', default=False)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES
+            if alias != DEFAULT_DB_ALIAS]
+
+
+class ReplicaRouter:
+    # Чтение уходит на реплику только внутри запросов ReplicaReadMixin,
+    # все остальное (админка, команды, воркер) работает с основной базой.
+
+    def db_for_read(self, model, **hints):
+        return read_alias.get() or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def pin_key(user):
+    return f'{PIN_PREFIX}{user.pk}'
+
+
+def pin_cache():
+    return caches[settings.DB_REPLICA_PIN_CACHE_ALIAS]
+
+
+class ReplicaReadMixin:
+    # Безопасные запросы читают с реплики после аутентификации, так что
+    # свежевыданный токен всегда ищется в основной базе. Пользователь,
+    # который только что писал, на DB_REPLICA_PIN_SECONDS остается на
+    # основной базе и видит свои изменения.
+
+    def initial(self, request, *args, **kwargs):
+        self.replica_tokens = (read_alias.set(None), wrote.set(False))
+        super().initial(request, *args, **kwargs)
+        aliases = replica_aliases()
+        if (aliases and request.method in SAFE_METHODS
+                and not (request.user.is_authenticated
+                         and pin_cache().get(pin_key(request.user)))):
+            read_alias.set(random.choice(aliases))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        tokens = getattr(self, 'replica_tokens', None)
+        if tokens is not None:
+            if wrote.get() and request.user.is_authenticated:
+                pin_cache().set(pin_key(request.user), True,
+                                settings.DB_REPLICA_PIN_SECONDS)
+            read_alias.reset(tokens[0])
+            wrote.reset(tokens[1])
+            self.replica_tokens = None
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -1,15 +1,118 @@
+import json
+
 from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from drf_base64.fields import Base64ImageField
-from rest_framework import serializers
-
+from rest_framework import exceptions, serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from foodgram_backend.constants import RECIPES_LIMIT
+from recipes.images import (FORMATS, RENDITIONS, rendition_name,
+                            rendition_urls)
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
 from users.models import Subscription
+from .authentication import CLAIM_FIELDS, jwt_revocations
+from .recipe_pages import recipe_pages
+from .uploads import check_image_header
 
 User = get_user_model()
 
 
-class UserGetSerializer(serializers.ModelSerializer):
+def renditions_ready(image):
+    # Пока воркер не записал копии текущей картинки, вместо них
+    # отдается оригинал.
+    return bool(image) and image.instance.renditions_image == image.name
+
+
+class RecipeImageField(Base64ImageField):
+    # ?image_size=thumbnail|card|full отдает уменьшенную JPEG-копию.
+    def to_representation(self, value):
+        request = self.context.get('request')
+        size = request and request.query_params.get('image_size')
+        if size not in RENDITIONS or not renditions_ready(value):
+            return super().to_representation(value)
+        url = default_storage.url(rendition_name(value.name, size, 'jpeg'))
+        return request.build_absolute_uri(url)
+
+
+class IngredientsField(serializers.ListField):
+    # В multipart/form-data список ингредиентов приходит JSON-строкой.
+    def to_internal_value(self, data):
+        if (isinstance(data, list) and len(data) == 1
+                and isinstance(data[0], str)):
+            data = data[0]
+        if isinstance(data, str):
+            try:
+                data = json.loads(data)
+            except ValueError:
+                raise serializers.ValidationError(
+                    'Ингредиенты должны быть JSON-списком')
+        return super().to_internal_value(data)
+
+
+class ImageRenditionsField(serializers.Field):
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        request = self.context.get('request')
+        if not renditions_ready(value):
+            url = value.url
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            return {size: dict.fromkeys(FORMATS, url) for size in RENDITIONS}
+        return rendition_urls(value.name, request)
+
+
+def get_subscribed_ids(request):
+    # Подписки загружаются один раз за запрос для всех сериализаторов.
+    if request is None or not request.user.is_authenticated:
+        return frozenset()
+    if not hasattr(request, '_subscribed_ids'):
+        request._subscribed_ids = frozenset(
+            Subscription.objects.filter(
+                user=request.user
+            ).values_list('author_id', flat=True)
+        )
+    return request._subscribed_ids
+
+
+class IsSubscribedMixin:
+    def get_is_subscribed(self, obj):
+        return obj.id in get_subscribed_ids(self.context.get('request'))
+
+
+def get_recipes_limit(request):
+    if request is None:
+        return RECIPES_LIMIT
+    try:
+        limit = int(request.query_params.get('recipes_limit', RECIPES_LIMIT))
+    except ValueError:
+        return RECIPES_LIMIT
+    return max(limit, 0)
+
+
+class SubscriptionRecipesMixin:
+    def get_recipes(self, obj):
+        recipes = getattr(obj, 'limited_recipes', None)
+        if recipes is None:
+            limit = get_recipes_limit(self.context.get('request'))
+            recipes = obj.recipes.all()[:limit]
+        serializer = SubscribersRecipeSerializer(
+            recipes, many=True, read_only=True, context=self.context
+        )
+        return serializer.data
+
+
+class UserGetSerializer(IsSubscribedMixin, serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -18,13 +121,6 @@ class UserGetSerializer(serializers.ModelSerializer):
                   'first_name', 'last_name',
                   'is_subscribed')
 
-    def get_is_subscribed(self, obj):
-        if (obj.is_authenticated):
-            return obj.follower.filter(
-                user=obj
-            ).exists()
-        return False
-
 
 class UserShowCreateSerializer(serializers.ModelSerializer):
 
@@ -72,15 +168,59 @@ class SetPasswordSerializer(serializers.Serializer):
 
         new_password = attrs.get('new_password')
         user.set_password(new_password)
-        user.save()
+        # Пользователь собран из кеша авторизации или клеймов JWT, и
+        # остальные его поля могут отставать от базы.
+        user.save(update_fields=('password',))
 
         return attrs
 
 
-class SubscriptionsGetSerializer(serializers.ModelSerializer):
+class JWTObtainSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        # auth_time точнее iat и сравнивается с моментом отзыва токенов.
+        token['auth_time'] = token.current_time.timestamp()
+        for field in CLAIM_FIELDS:
+            token[field] = getattr(user, field)
+        return token
+
+
+class JWTRefreshSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+    access = serializers.CharField(read_only=True)
+
+    def validate(self, attrs):
+        # Клеймы перечитываются из базы, старый refresh-токен попадает в
+        # черный список, новый - в список выданных токенов пользователя.
+        refresh = RefreshToken(attrs['refresh'])
+        user = User.objects.filter(
+            id=refresh[jwt_settings.USER_ID_CLAIM], is_active=True).first()
+        if user is None:
+            raise exceptions.AuthenticationFailed(
+                'Пользователь не найден или неактивен.',
+                code='user_inactive')
+        refresh.blacklist()
+        token = JWTObtainSerializer.get_token(user)
+        return {'refresh': str(token), 'access': str(token.access_token)}
+
+
+class JWTLogoutSerializer(serializers.Serializer):
+    refresh = serializers.CharField(write_only=True)
+
+    def validate(self, attrs):
+        RefreshToken(attrs['refresh']).blacklist()
+        access = self.context['request'].auth
+        if isinstance(access, AccessToken):
+            jwt_revocations.revoke_token(access)
+        return {}
+
+
+class SubscriptionsGetSerializer(IsSubscribedMixin, SubscriptionRecipesMixin,
+                                 serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta:
         model = User
@@ -89,25 +229,12 @@ class SubscriptionsGetSerializer(serializers.ModelSerializer):
                   'last_name', 'is_subscribed',
                   'recipes', 'recipes_count')
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
 
-    def get_recipes(self, obj):
-        recipes = obj.recipes.all()[:3]
-        serializer = SubscribersRecipeSerializer(recipes, many=True,
-                                                 read_only=True)
-        return serializer.data
-
-    def get_is_subscribed(self, obj):
-        return obj.follower.filter(
-            user=obj
-        ).exists()
-
-
-class SubscriptionsSerializer(serializers.ModelSerializer):
+class SubscriptionsSerializer(IsSubscribedMixin, SubscriptionRecipesMixin,
+                              serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
     email = serializers.ReadOnlyField()
     username = serializers.ReadOnlyField()
     first_name = serializers.ReadOnlyField()
@@ -120,22 +247,6 @@ class SubscriptionsSerializer(serializers.ModelSerializer):
                   'last_name', 'is_subscribed',
                   'recipes', 'recipes_count')
 
-    def get_is_subscribed(self, obj):
-        return (
-            Subscription.objects.filter(user=self.context['request'].user,
-                                        author=obj).exists()
-        )
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
-    def get_recipes(self, obj):
-        recipes = obj.recipes.all()[:3]
-        serializer = SubscribersRecipeSerializer(
-            recipes, many=True, read_only=True
-        )
-        return serializer.data
-
 
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
@@ -176,42 +287,46 @@ class RecipeGetSerializer(serializers.ModelSerializer):
     author = UserGetSerializer(read_only=True)
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    image = Base64ImageField()
+    image = RecipeImageField()
+    images = ImageRenditionsField(source='image')
 
     def get_is_favorited(self, obj):
-        if (self.context.get('request')
-           and self.context['request'].user.is_authenticated):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
             return Favorite.objects.filter(
-                user=self.context['request'].user,
+                user=request.user,
                 recipe=obj
             ).exists()
         return False
 
     def get_is_in_shopping_cart(self, obj):
-        if (self.context.get('request')
-           and self.context['request'].user.is_authenticated):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
             return ShoppingCart.objects.filter(
-                user=self.context['request'].user,
+                user=request.user,
                 recipe=obj
             ).exists()
         return False
 
     def get_ingredients(self, obj):
-        recipe_ingredients = RecipeIngredient.objects.filter(recipe=obj)
         serializer = RecipeIngredientSerializer(
-            recipe_ingredients, many=True,
+            obj.recipe.all(), many=True,
             context={'recipe_id': obj.id})
         return serializer.data
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image',
+                  'is_in_shopping_cart', 'name', 'image', 'images',
                   'text', 'cooking_time')
 
 
 class RecipeSerializer(serializers.Serializer):
-    ingredients = serializers.ListField(
+    ingredients = IngredientsField(
         child=serializers.DictField(
             child=serializers.IntegerField(),
             allow_empty=False
@@ -233,58 +348,123 @@ class RecipeSerializer(serializers.Serializer):
         fields = ('ingredients', 'tags', 'image',
                   'name', 'text', 'cooking_time')
 
+    def validate_ingredients(self, value):
+        ids = [ingredient.get('id') for ingredient in value]
+        if None in ids:
+            raise serializers.ValidationError('Не указан id ингредиента')
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError(
+                'Ингредиенты не должны повторяться')
+        if any(ingredient.get('amount', 0) < 1 for ingredient in value):
+            raise serializers.ValidationError(
+                'Количество ингредиента должно быть больше нуля')
+        missing = set(ids) - set(
+            Ingredient.objects.filter(id__in=ids).values_list('id', flat=True)
+        )
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {sorted(missing)}')
+        return value
+
+    def validate_image(self, value):
+        check_image_header(value)
+        return value
+
+    def create_ingredients(self, recipe, ingredients_data):
+        recipe_ingredients = [
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient_id=ingredient_data['id'],
+                amount=ingredient_data['amount']
+            )
+            for ingredient_data in ingredients_data
+        ]
+        if recipe_ingredients:
+            RecipeIngredient.objects.bulk_create(recipe_ingredients)
+
+    @transaction.atomic
     def create(self, validated_data):
-        ingredients_ids = []
-        ingredients_data = self.initial_data.get('ingredients')
-        validated_data.pop('ingredients')
+        ingredients_data = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
-        for ingredient_data in ingredients_data:
-            ingredients_ids.append(ingredient_data.get('id'))
-            ingredient = Ingredient.objects.get(id=ingredient_data.get('id'))
-            RecipeIngredient.objects.create(
-                recipe=recipe,
-                ingredient=ingredient,
-                amount=ingredient_data.get('amount')
-            )
-        recipe.ingredients.set(ingredients_ids)
+        self.create_ingredients(recipe, ingredients_data)
         return recipe
 
-    def update(self, instance, validated_data):
-        ingredients_ids = []
-        tags = validated_data.pop('tags')
-        ingredients_data = validated_data.pop('ingredients')
-        instance.tags.set(tags)
-        instance.ingredients.clear()
-        for ingredient_data in ingredients_data:
-            ingredient_id = ingredient_data.get('id')
-            ingredients_ids.append(ingredient_id)
-            ingredient = Ingredient.objects.get(id=ingredient_id)
-            RecipeIngredient.objects.create(
-                recipe=instance,
-                ingredient=ingredient,
-                amount=ingredient_data.get('amount')
+    def update_ingredients(self, recipe, ingredients_data):
+        amounts = {
+            ingredient_data['id']: ingredient_data['amount']
+            for ingredient_data in ingredients_data
+        }
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe
             )
-        instance.ingredients.set(ingredients_ids)
-        instance.name = validated_data.get('name', instance.name)
-        instance.text = validated_data.get('text', instance.text)
-        instance.cooking_time = validated_data.get(
-            'cooking_time', instance.cooking_time
-        )
-        instance.image = validated_data.get('image', instance.image)
-        instance.save()
+        }
+        removed = current.keys() - amounts.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id, recipe_ingredient in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and amount != recipe_ingredient.amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ('amount',))
+        self.create_ingredients(recipe, (
+            {'id': ingredient_id, 'amount': amount}
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in current
+        ))
+
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        tags = validated_data.pop('tags', None)
+        ingredients_data = validated_data.pop('ingredients', None)
+        if tags is not None or ingredients_data is not None:
+            # Параллельные изменения рецепта ждут друг друга, иначе оба
+            # посчитают разницу по одним строкам и вставят одинаковые.
+            Recipe.objects.select_for_update().filter(
+                pk=instance.pk).values_list('pk').get()
+        if tags is not None:
+            # set() сам удаляет и добавляет только отличающиеся теги.
+            instance.tags.set(tags)
+        if ingredients_data is not None:
+            self.update_ingredients(instance, ingredients_data)
+        if tags is not None or ingredients_data is not None:
+            # Теги и bulk-операции с ингредиентами не отправляют сигналы
+            # сохранения, страницы рецептов сбрасываются явно.
+            transaction.on_commit(recipe_pages.invalidate)
+        changed_fields = [
+            field for field, value in validated_data.items()
+            if getattr(instance, field) != value
+        ]
+        for field in changed_fields:
+            setattr(instance, field, validated_data[field])
+        if changed_fields:
+            instance.save(update_fields=changed_fields)
         return instance
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance], 'tags',
+            Prefetch('recipe',
+                     queryset=RecipeIngredient.objects.select_related(
+                         'ingredient'))
+        )
         return RecipeGetSerializer(
             instance,
             context={'request': self.context.get('request')}).data
 
 
 class SubscribersRecipeSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    image = RecipeImageField()
+    images = ImageRenditionsField(source='image')
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'images', 'cooking_time')
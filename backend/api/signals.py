@@ -0,0 +1,118 @@
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_out
+from django.db import transaction
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.tokens import AccessToken
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            Tag)
+from recipes.signals import recipes_changed
+from users.models import MyUser
+from users.signals import auth_revoked
+from .authentication import (CLAIM_FIELDS, SNAPSHOT_FIELDS, jwt_revocations,
+                             revoke_jwt, token_cache)
+from .catalog import ingredient_catalog, tag_catalog
+from .ingredients_index import ingredient_index
+from .recipe_pages import recipe_pages
+
+# Сохранения, меняющие только эти поля, не сбрасывают кеш авторизации.
+SNAPSHOT_UPDATES = frozenset(SNAPSHOT_FIELDS) | {'password'}
+# Изменение этих полей отзывает выданные пользователю JWT.
+REVOKING_FIELDS = CLAIM_FIELDS + ('password',)
+# Поля автора, которые выводятся на страницах рецептов.
+AUTHOR_FIELDS = frozenset(('email', 'username', 'first_name', 'last_name'))
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredients(sender, **kwargs):
+    transaction.on_commit(ingredient_index.invalidate)
+    transaction.on_commit(ingredient_catalog.invalidate)
+    transaction.on_commit(recipe_pages.invalidate)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(sender, **kwargs):
+    transaction.on_commit(tag_catalog.invalidate)
+    transaction.on_commit(recipe_pages.invalidate)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def invalidate_recipe_pages(sender, **kwargs):
+    transaction.on_commit(recipe_pages.invalidate)
+
+
+@receiver(recipes_changed)
+def invalidate_changed_recipe_pages(sender, **kwargs):
+    recipe_pages.invalidate()
+
+
+@receiver((post_save, post_delete), sender=Favorite)
+def invalidate_popular_pages(sender, **kwargs):
+    transaction.on_commit(recipe_pages.invalidate_popular)
+
+
+@receiver(post_save, sender=MyUser)
+def invalidate_author_pages(sender, instance, created, update_fields=None,
+                            **kwargs):
+    if created or update_fields is not None and not (
+            AUTHOR_FIELDS & set(update_fields)):
+        return
+    transaction.on_commit(recipe_pages.invalidate)
+
+
+@receiver(post_save, sender=MyUser)
+def invalidate_user_tokens(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not (
+            SNAPSHOT_UPDATES & set(update_fields)):
+        return
+    user_ids = [instance.id]
+    transaction.on_commit(lambda: token_cache.invalidate_users(user_ids))
+
+
+@receiver(pre_save, sender=MyUser)
+def revoke_changed_user_jwt(sender, instance, update_fields=None, **kwargs):
+    if settings.AUTH_MODE != 'jwt' or instance.pk is None:
+        return
+    fields = [field for field in REVOKING_FIELDS
+              if field not in instance.get_deferred_fields()
+              and (update_fields is None or field in update_fields)]
+    if not fields:
+        return
+    saved = MyUser.objects.filter(pk=instance.pk).values(*fields).first()
+    if saved is not None and any(
+            saved[field] != getattr(instance, field) for field in fields):
+        user_ids = [instance.pk]
+        transaction.on_commit(lambda: revoke_jwt(user_ids))
+
+
+@receiver(pre_delete, sender=MyUser)
+def invalidate_deleted_user_tokens(sender, instance, **kwargs):
+    keys = list(Token.objects.filter(user_id=instance.id).values_list(
+        'key', flat=True))
+    transaction.on_commit(lambda: token_cache.invalidate(keys))
+    if settings.AUTH_MODE == 'jwt':
+        user_ids = [instance.id]
+        transaction.on_commit(
+            lambda: jwt_revocations.revoke_users(user_ids))
+
+
+@receiver(user_logged_out)
+def invalidate_logged_out_token(sender, request, **kwargs):
+    # Выйти через api/auth/token/logout/ можно и с JWT: тогда отзывается
+    # текущий access-токен.
+    token = getattr(request, 'auth', None)
+    if isinstance(token, Token):
+        token_cache.invalidate([token.key])
+    elif isinstance(token, AccessToken):
+        jwt_revocations.revoke_token(token)
+
+
+@receiver(auth_revoked)
+def invalidate_revoked_tokens(sender, token_keys, user_ids=(), **kwargs):
+    token_cache.invalidate(token_keys)
+    if settings.AUTH_MODE == 'jwt':
+        revoke_jwt(user_ids)
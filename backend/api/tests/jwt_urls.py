@@ -0,0 +1,7 @@
+from django.urls import include, path
+
+from foodgram_backend.urls import urlpatterns as project_urlpatterns
+from ..urls import jwt_urlpatterns
+
+# Адреса JWT подключаются только при AUTH_MODE=jwt на момент импорта.
+urlpatterns = [path('api/', include(jwt_urlpatterns))] + project_urlpatterns
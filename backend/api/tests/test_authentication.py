@@ -0,0 +1,102 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from rest_framework.views import APIView
+
+from users.models import MyUser as User
+from ..authentication import (CachedTokenAuthentication, RevocationList,
+                              StatelessJWTAuthentication, TokenCache)
+from ..serializers import JWTObtainSerializer
+
+
+@override_settings(AUTH_CACHE_ALIAS='default')
+class CachedTokenAuthenticationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            password='readerpassword', first_name='Читатель',
+            last_name='Читатель')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_logout_reaches_other_processes(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        # Экземпляр кеша другого процесса видит тот же общий кеш.
+        other = TokenCache()
+        self.assertIsNotNone(other.get(self.token.key)[0])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/auth/token/logout/')
+        self.assertIsNone(other.get(self.token.key)[0])
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_set_password_keeps_fields_changed_elsewhere(self):
+        self.client.get('/api/users/me/')
+        # Блокировка в обход сигналов: снимок в кеше остается старым.
+        User.objects.filter(pk=self.user.pk).update(is_blocked=True)
+        response = self.client.post('/api/users/set_password/', {
+            'current_password': 'readerpassword',
+            'new_password': 'newreaderpassword',
+        })
+        self.assertEqual(response.status_code, 204)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_blocked)
+        self.assertTrue(self.user.check_password('newreaderpassword'))
+
+    def test_snapshot_read_before_invalidation_is_not_used(self):
+        self.assert_stale_snapshot_is_dropped(TokenCache())
+
+    @override_settings(AUTH_CACHE_ALIAS=None, AUTH_CACHE_TTL=60)
+    def test_local_snapshot_read_before_invalidation_is_not_used(self):
+        self.assert_stale_snapshot_is_dropped(TokenCache())
+
+    def assert_stale_snapshot_is_dropped(self, token_cache):
+        key = self.token.key
+        snapshot, version = token_cache.get(key)
+        self.assertIsNone(snapshot)
+        # Снимок прочитан из базы до блокировки, а записывается после
+        # сброса кеша.
+        stale = (self.user.pk,)
+        token_cache.invalidate([key])
+        token_cache.set(key, version, stale)
+        self.assertIsNone(token_cache.get(key)[0])
+        snapshot, version = token_cache.get(key)
+        token_cache.set(key, version, stale)
+        self.assertEqual(token_cache.get(key)[0], stale)
+
+
+# Классы авторизации view берутся из настроек при импорте, поэтому
+# режим jwt подменяется на APIView.
+@override_settings(AUTH_MODE='jwt', AUTH_CACHE_ALIAS='default')
+@mock.patch.object(APIView, 'authentication_classes', (
+    StatelessJWTAuthentication, CachedTokenAuthentication))
+class StatelessJWTAuthenticationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            password='readerpassword', first_name='Читатель',
+            last_name='Читатель')
+        self.access = JWTObtainSerializer.get_token(self.user).access_token
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Bearer {self.access}')
+
+    def test_token_logout_with_bearer_revokes_access_token(self):
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_revocation_reaches_other_processes(self):
+        # Списки разных процессов видят друг друга только через общий кеш.
+        RevocationList().revoke_token(self.access)
+        self.assertTrue(RevocationList().is_revoked(self.access))
+
+    def test_user_revocation_reaches_other_processes(self):
+        RevocationList().revoke_users([self.user.pk])
+        self.assertTrue(RevocationList().is_revoked(self.access))
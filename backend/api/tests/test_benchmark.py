@@ -0,0 +1,37 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TransactionTestCase, override_settings
+from rest_framework.views import APIView
+
+from ..authentication import (CachedTokenAuthentication,
+                              StatelessJWTAuthentication)
+from ..management.commands.benchmark import BENCHMARK_SETTINGS, Command
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, AUTH_MODE='jwt',
+                   ROOT_URLCONF='api.tests.jwt_urls', **BENCHMARK_SETTINGS)
+@mock.patch.object(APIView, 'authentication_classes', (
+    StatelessJWTAuthentication, CachedTokenAuthentication))
+class BenchmarkJWTTest(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def test_all_endpoints_respond(self):
+        # Отзыв JWT при смене пароля идет в on_commit, поэтому замер, как и
+        # команда, работает без общей транзакции теста.
+        cache.clear()
+        options = {'users': 10, 'recipes': 60, 'seed': 1, 'warmup': 0,
+                   'iterations': 2, 'only': None, 'latency_factor': 1.0}
+        command = Command()
+        command.seed(options)
+        # run поднимает CommandError на любой ответ с ошибкой.
+        results = command.run(options)
+        self.assertIn('jwt: recipes list', results)
+        self.assertIn('jwt: refresh', results)
@@ -0,0 +1,73 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Tag
+from ..catalog import Catalog, tag_catalog
+from ..ingredients_index import IngredientIndex
+
+
+@override_settings(CATALOG_CACHE_ALIAS='default')
+class CatalogTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        Tag.objects.create(name='Завтрак', color='#E26C2D', slug='breakfast')
+
+    def test_invalidation_reaches_other_processes(self):
+        # Второй экземпляр с тем же именем заменяет копию другого процесса.
+        other = Catalog('tags', tag_catalog._get_data)
+        self.assertEqual(len(other.get().data), 1)
+        self.assertEqual(len(tag_catalog.get().data), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name='Обед', color='#49B64E', slug='lunch')
+        entry = other.get()
+        self.assertEqual(len(entry.data), 2)
+        self.assertEqual(entry.etag, tag_catalog.get().etag)
+        self.assertEqual(entry.last_modified,
+                         tag_catalog.get().last_modified)
+
+    def test_weak_etag_is_not_modified(self):
+        client = APIClient()
+        etag = client.get('/api/tags/', HTTP_ACCEPT_ENCODING='gzip')['ETag']
+        response = client.get('/api/tags/', HTTP_ACCEPT_ENCODING='gzip',
+                              HTTP_IF_NONE_MATCH=f'W/{etag}')
+        self.assertEqual(response.status_code, 304)
+
+
+@override_settings(CATALOG_CACHE_ALIAS=None)
+class CatalogWithoutSharedCacheTest(TestCase):
+    def test_changes_of_other_processes_are_visible(self):
+        Tag.objects.create(name='Завтрак', color='#E26C2D', slug='breakfast')
+        client = APIClient()
+        self.assertEqual(len(client.get('/api/tags/').json()), 1)
+        # Сигналы другого процесса сюда не доходят: on_commit не выполняется.
+        Tag.objects.create(name='Обед', color='#49B64E', slug='lunch')
+        self.assertEqual(len(client.get('/api/tags/').json()), 2)
+
+
+@override_settings(CATALOG_CACHE_ALIAS='default')
+class IngredientIndexTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_invalidation_reaches_other_processes(self):
+        other = IngredientIndex()
+        self.assertEqual(other.search('соль'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='Соль', measurement_unit='г')
+        self.assertEqual([item['name'] for item in other.search('соль')],
+                         ['Соль'])
+
+
+@override_settings(CATALOG_CACHE_ALIAS=None)
+class IngredientSearchWithoutSharedCacheTest(TestCase):
+    def test_searches_database(self):
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        # SQLite сравнивает без учета регистра только латиницу.
+        Ingredient.objects.create(name='Морская Соль', measurement_unit='г')
+        index = IngredientIndex()
+        self.assertEqual([item['name'] for item in index.search('Соль ')],
+                         ['Соль', 'Морская Соль'])
+        Ingredient.objects.create(name='Соль крупная', measurement_unit='г')
+        self.assertEqual([item['name'] for item in index.search('Соль')],
+                         ['Соль', 'Соль крупная', 'Морская Соль'])
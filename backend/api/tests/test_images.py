@@ -0,0 +1,92 @@
+import io
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from recipes.images import (create_renditions, rendition_name,
+                            rendition_names)
+from recipes.models import Recipe
+from users.models import MyUser as User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, JOBS_EAGER=True,
+                   RECIPE_PAGE_CACHE_TTL=0)
+class RecipeRenditionsTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 600), '#E26C2D').save(buffer, 'JPEG')
+        self.image = default_storage.save('recipes/shared.jpg',
+                                          ContentFile(buffer.getvalue()))
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='authorpassword', first_name='Автор', last_name='Автор')
+
+    def create_recipe(self, name):
+        return Recipe.objects.create(
+            author=self.author, name=name, text='Описание',
+            image=self.image, cooking_time=10)
+
+    def get_recipe(self, recipe, query=''):
+        return APIClient().get(f'/api/recipes/{recipe.id}/{query}').data
+
+    def test_original_is_returned_until_renditions_are_ready(self):
+        recipe = self.create_recipe('Рецепт')
+        data = self.get_recipe(recipe, '?image_size=card')
+        self.assertTrue(data['image'].endswith(self.image))
+        self.assertTrue(data['images']['card']['webp'].endswith(self.image))
+
+        # Задача второго рецепта готовит копии для всех рецептов с этой
+        # картинкой.
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_recipe('Второй рецепт')
+        data = self.get_recipe(recipe, '?image_size=card')
+        card = rendition_name(self.image, 'card', 'jpeg')
+        self.assertTrue(data['image'].endswith(card))
+        self.assertTrue(default_storage.exists(card))
+
+    def test_shared_renditions_outlive_one_recipe(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            first = self.create_recipe('Первый')
+            self.create_recipe('Второй')
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(all(default_storage.exists(name)
+                            for name in rendition_names(self.image)))
+
+    def test_command_marks_recipes_with_existing_renditions(self):
+        # Рецепты, созданные до отметки копий: задача для них не ставилась.
+        created = self.create_recipe('С копиями')
+        create_renditions(self.image)
+        buffer = io.BytesIO()
+        Image.new('RGB', (800, 600), '#49B64E').save(buffer, 'JPEG')
+        other_image = default_storage.save('recipes/other.jpg',
+                                           ContentFile(buffer.getvalue()))
+        missing = Recipe.objects.create(
+            author=self.author, name='Без копий', text='Описание',
+            image=other_image, cooking_time=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('create_renditions', stdout=io.StringIO(),
+                         stderr=io.StringIO())
+        for recipe, image in ((created, self.image), (missing, other_image)):
+            data = self.get_recipe(recipe, '?image_size=card')
+            card = rendition_name(image, 'card', 'jpeg')
+            self.assertTrue(data['image'].endswith(card))
+            self.assertTrue(default_storage.exists(card))
+
+    def test_rendition_names_depend_on_full_path(self):
+        self.assertNotEqual(
+            rendition_name('recipes/a/photo.jpg', 'card', 'webp'),
+            rendition_name('recipes/b/photo.jpg', 'card', 'webp'))
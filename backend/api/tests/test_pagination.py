@@ -0,0 +1,35 @@
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from users.models import MyUser as User
+
+
+@override_settings(RECIPE_PAGE_CACHE_TTL=0)
+class RecipeCursorPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='authorpassword', first_name='Автор', last_name='Автор')
+        for number in range(3):
+            Recipe.objects.create(author=author, name=f'Рецепт {number}',
+                                  text='Описание', image='recipes/test.jpg',
+                                  cooking_time=10)
+
+    def test_cursor_pages_by_id(self):
+        for query in ('', '&ordering=new'):
+            response = APIClient().get(
+                f'/api/recipes/?pagination=cursor&limit=2{query}')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                [recipe['id'] for recipe in response.data['results']],
+                list(Recipe.objects.values_list('id', flat=True)[:2]))
+            self.assertIsNotNone(response.data['next'])
+
+    def test_cursor_rejects_other_orderings(self):
+        for query in ('ordering=popular', 'search=рецепт'):
+            response = APIClient().get(
+                f'/api/recipes/?pagination=cursor&{query}')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('pagination', response.data)
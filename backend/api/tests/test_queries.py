@@ -0,0 +1,86 @@
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            Tag)
+from users.models import MyUser as User
+
+
+@override_settings(RECIPE_PAGE_CACHE_TTL=0)
+class RecipeQueriesTest(TestCase):
+    # Число запросов страницы не зависит от числа рецептов на ней.
+    LIST_QUERIES = 5
+    DETAIL_QUERIES = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {number}', color=f'#00000{number}',
+                               slug=f'tag{number}')
+            for number in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {number}',
+                                      measurement_unit='г')
+            for number in range(10)
+        ]
+        cls.authors = [
+            User.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com',
+                password='authorpassword', first_name='Автор',
+                last_name=str(number))
+            for number in range(3)
+        ]
+        cls.user = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            password='readerpassword', first_name='Читатель',
+            last_name='Читатель')
+        cls.add_recipes(3)
+        Favorite.objects.create(user=cls.user, recipe=Recipe.objects.first())
+
+    @classmethod
+    def add_recipes(cls, count):
+        start = Recipe.objects.count()
+        for number in range(start, start + count):
+            recipe = Recipe.objects.create(
+                author=cls.authors[number % len(cls.authors)],
+                name=f'Рецепт {number}', text='Описание',
+                image='recipes/test.jpg', cooking_time=10)
+            recipe.tags.set(cls.tags[:number % len(cls.tags) + 1])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=10)
+                for ingredient in cls.ingredients[number % 5:number % 5 + 4]
+            )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_list_queries(self, limit):
+        with self.assertNumQueries(self.LIST_QUERIES):
+            response = self.client.get(f'/api/recipes/?limit={limit}')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), limit)
+
+    def test_list_queries_do_not_grow_with_page_size(self):
+        self.assert_list_queries(3)
+        self.add_recipes(9)
+        self.assert_list_queries(12)
+
+    def test_anonymous_list_queries(self):
+        self.add_recipes(9)
+        with self.assertNumQueries(self.LIST_QUERIES - 1):
+            response = APIClient().get('/api/recipes/?limit=12')
+        self.assertEqual(len(response.data['results']), 12)
+
+    def test_detail_queries(self):
+        recipe = Recipe.objects.first()
+        with self.assertNumQueries(self.DETAIL_QUERIES):
+            response = self.client.get(f'/api/recipes/{recipe.id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            len(response.data['ingredients']),
+            RecipeIngredient.objects.filter(recipe=recipe).count())
+        self.assertTrue(response.data['is_favorited'])
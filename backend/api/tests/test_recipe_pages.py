@@ -0,0 +1,54 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite, Recipe
+from recipes.signals import recipes_changed
+from users.models import MyUser as User
+
+
+@override_settings(RECIPE_PAGE_CACHE_ALIAS='default')
+class RecipePageCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='authorpassword', first_name='Автор', last_name='Автор')
+        cls.recipes = [
+            Recipe.objects.create(author=cls.author, name=f'Рецепт {number}',
+                                  text='Описание', image='recipes/test.jpg',
+                                  cooking_time=10)
+            for number in range(2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def names(self, query=''):
+        return [recipe['name'] for recipe in
+                self.client.get(f'/api/recipes/{query}').data['results']]
+
+    def test_pages_are_cached_until_recipes_change(self):
+        self.names()
+        with self.assertNumQueries(0):
+            self.names()
+        Recipe.objects.filter(pk=self.recipes[0].pk).update(name='Новое')
+        with self.captureOnCommitCallbacks(execute=True):
+            recipes_changed.send(sender=Recipe)
+        self.assertIn('Новое', self.names())
+
+    def test_favorites_refresh_popular_pages_only(self):
+        self.assertEqual(self.names('?ordering=popular')[0], 'Рецепт 1')
+        self.names()
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorite.objects.create(user=self.author, recipe=self.recipes[0])
+        self.assertEqual(self.names('?ordering=popular')[0], 'Рецепт 0')
+        with self.assertNumQueries(0):
+            self.names()
+
+    @override_settings(RECIPE_PAGE_CACHE_ALIAS=None)
+    def test_pages_are_not_cached_without_shared_cache(self):
+        self.names()
+        with self.assertNumQueries(4):
+            self.names()
@@ -0,0 +1,79 @@
+from io import BytesIO
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+from foodgram_backend.constants import MAX_IMAGE_SIDE, MAX_IMAGE_SIZE
+
+# Сколько байт начала файла держать в памяти для чтения заголовка.
+HEADER_SIZE = 256 * 1024
+# Запас на поля формы и границы multipart поверх размера картинки.
+FORM_OVERHEAD = 1024 * 1024
+
+SIZE_ERROR = f'Размер изображения больше {MAX_IMAGE_SIZE // 1024 ** 2} МБ'
+SIDE_ERROR = f'Стороны изображения должны быть не больше {MAX_IMAGE_SIDE} px'
+
+
+def image_error(message):
+    return ValidationError({'image': [message]})
+
+
+def read_dimensions(file):
+    # Image.open читает только заголовок, пиксели не декодируются.
+    position = file.tell()
+    try:
+        return Image.open(file).size
+    except Image.DecompressionBombError:
+        return MAX_IMAGE_SIDE + 1, MAX_IMAGE_SIDE + 1
+    except OSError:
+        return None
+    finally:
+        file.seek(position)
+
+
+def check_image_header(file):
+    if file.size > MAX_IMAGE_SIZE:
+        raise ValidationError(SIZE_ERROR)
+    dimensions = read_dimensions(file)
+    if dimensions is None:
+        raise ValidationError('Файл не является изображением')
+    if max(dimensions) > MAX_IMAGE_SIDE:
+        raise ValidationError(SIDE_ERROR)
+
+
+class RecipeImageUploadHandler(TemporaryFileUploadHandler):
+    # Файл из multipart/form-data пишется во временный файл частями.
+    # Размер и габариты проверяются по мере поступления данных, поэтому
+    # слишком большие картинки отклоняются до конца загрузки.
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        if content_length > MAX_IMAGE_SIZE + FORM_OVERHEAD:
+            raise image_error(SIZE_ERROR)
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.header = b''
+
+    def receive_data_chunk(self, raw_data, start):
+        if start + len(raw_data) > MAX_IMAGE_SIZE:
+            self.upload_interrupted()
+            raise image_error(SIZE_ERROR)
+        if self.header is not None:
+            self.check_header(raw_data)
+        return super().receive_data_chunk(raw_data, start)
+
+    def check_header(self, raw_data):
+        self.header += raw_data
+        dimensions = read_dimensions(BytesIO(self.header))
+        if dimensions is None:
+            # Заголовок пришел не целиком. Если он так и не прочитался,
+            # решение примет проверка уже загруженного файла.
+            if len(self.header) >= HEADER_SIZE:
+                self.header = None
+            return
+        self.header = None
+        if max(dimensions) > MAX_IMAGE_SIDE:
+            self.upload_interrupted()
+            raise image_error(SIDE_ERROR)
@@ -1,7 +1,13 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework import routers
+from rest_framework_simplejwt.views import (TokenBlacklistView,
+                                            TokenObtainPairView,
+                                            TokenRefreshView)
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet, UsersViewSet
+from .authentication import StatelessJWTAuthentication
+from .views import (IngredientViewSet, MetricsView, RecipeViewSet, TagViewSet,
+                    UsersViewSet)
 
 router = routers.DefaultRouter()
 router.register(
@@ -27,5 +33,19 @@ router.register(
 
 urlpatterns = [
     path('auth/', include('djoser.urls.authtoken')),
+    path('metrics/', MetricsView.as_view()),
     path('', include(router.urls)),
 ]
+
+jwt_urlpatterns = [
+    path('auth/jwt/', include([
+        path('create/', TokenObtainPairView.as_view(), name='jwt-create'),
+        path('refresh/', TokenRefreshView.as_view(), name='jwt-refresh'),
+        path('logout/', TokenBlacklistView.as_view(
+            authentication_classes=(StatelessJWTAuthentication,)
+        ), name='jwt-logout'),
+    ])),
+]
+
+if settings.AUTH_MODE == 'jwt':
+    urlpatterns = jwt_urlpatterns + urlpatterns
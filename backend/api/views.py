@@ -1,54 +1,125 @@
-import io
-
-from django.db.models import Exists, OuterRef, Sum, Value
+from django.db.models import (Exists, F, OuterRef, Prefetch, Sum, Value,
+                              Window)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.parsers import JSONParser, MultiPartParser
+from rest_framework.permissions import (SAFE_METHODS, IsAdminUser,
+                                        IsAuthenticated)
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
 from users.models import MyUser as User
 from users.models import Subscription
+from .catalog import ingredient_catalog, tag_catalog
 from .filters import RecipeFilter
-from .paginatiors import ResponsePaginator
+from .ingredients_index import ingredient_index
+from .metrics import metrics_store
+from .paginatiors import RecipePaginator, ResponsePaginator
 from .permissions import (IsAdminOrReadOnly, IsAuthor, IsBlockedUser,
                           IsCurrentUserOrAdmin, UserPermissions)
+from .recipe_pages import recipe_pages
+from .replicas import ReplicaReadMixin
 from .serializers import (IngredientSerializer, RecipeGetSerializer,
                           RecipeSerializer, SetPasswordSerializer,
                           RecipeActionSerializer,
                           SubscriptionsGetSerializer, SubscriptionsSerializer,
-                          TagSerializer, UserGetSerializer, UserSerializer)
+                          TagSerializer, UserGetSerializer, UserSerializer,
+                          get_recipes_limit)
+from .uploads import RecipeImageUploadHandler
 
 USER_ONLY_METHODS = ('create', 'update', 'partial_update', 'destroy')
 
 
-class TagViewSet(viewsets.ModelViewSet):
+def attach_limited_recipes(authors, limit):
+    # Последние limit рецептов каждого автора одним запросом через
+    # ROW_NUMBER() OVER (PARTITION BY author_id).
+    if not authors:
+        return
+    ranked = Recipe.objects.filter(author__in=authors).annotate(
+        recipe_rank=Window(
+            expression=RowNumber(),
+            partition_by=F('author_id'),
+            order_by=F('id').desc()
+        )
+    ).values('id', 'recipe_rank')
+    sql, params = ranked.query.sql_with_params()
+    recipes = Recipe.objects.filter(id__in=RawSQL(
+        f'SELECT id FROM ({sql}) AS ranked WHERE recipe_rank <= %s',
+        (*params, limit)
+    ))
+    recipes_by_author = {author.id: [] for author in authors}
+    for recipe in recipes:
+        recipes_by_author[recipe.author_id].append(recipe)
+    for author in authors:
+        author.limited_recipes = recipes_by_author[author.id]
+
+
+class TagViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_fields = ('slug',)
     permission_classes = (IsAdminOrReadOnly,)
 
+    def list(self, request, *args, **kwargs):
+        if tag_catalog.enabled and not request.query_params:
+            return tag_catalog.response(request)
+        return super().list(request, *args, **kwargs)
+
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (IsAdminOrReadOnly,)
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name is not None:
+            return Response(ingredient_index.search(name))
+        if ingredient_catalog.enabled and not request.query_params:
+            return ingredient_catalog.response(request)
+        return super().list(request, *args, **kwargs)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
-    pagination_class = ResponsePaginator
+    pagination_class = RecipePaginator
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    parser_classes = (JSONParser, MultiPartParser)
+
+    def initialize_request(self, request, *args, **kwargs):
+        # Картинка из multipart/form-data сразу пишется на диск частями.
+        request.upload_handlers = [RecipeImageUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        key = recipe_pages.key(request)
+        if key is None:
+            return super().list(request, *args, **kwargs)
+        data = recipe_pages.get(key)
+        if data is None:
+            response = super().list(request, *args, **kwargs)
+            recipe_pages.set(key, response.data)
+            return response
+        return Response(data)
 
     def get_queryset(self):
+        queryset = Recipe.objects.select_related('author').prefetch_related(
+            'tags',
+            Prefetch('recipe',
+                     queryset=RecipeIngredient.objects.select_related(
+                         'ingredient'))
+        )
         if self.request.user.is_authenticated:
-            return Recipe.objects.annotate(
+            return queryset.annotate(
                 is_favorited=Exists(
                     Favorite.objects.filter(
                         user=self.request.user,
@@ -57,8 +128,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
                     ShoppingCart.objects.filter(
                         user=self.request.user,
                         recipe=OuterRef('id')))
-            ).select_related('author')
-        return Recipe.objects.annotate(
+            )
+        return queryset.annotate(
             is_favorited=Value(False),
             is_in_shopping_cart=Value(False))
 
@@ -99,40 +170,26 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False, methods=['get'],
-            permission_classes=(IsBlockedUser,))
+            permission_classes=(IsAuthenticated, IsBlockedUser))
     def download_shopping_cart(self, request):
-        carts = ShoppingCart.objects.filter(user=request.user)
-        content = ""
-        total_ingredients = {}
-        for cart in carts if carts else []:
-            ingredients = cart.recipe.ingredients.values(
-                'id', 'name', 'measurement_unit'
-            )
-            for ingredient in ingredients:
-                name = ingredient['name']
-                amount = RecipeIngredient.objects.filter(
-                    recipe=cart.recipe, ingredient=ingredient['id']
-                ).aggregate(Sum('amount'))['amount__sum']
-                measurement_unit = ingredient['measurement_unit']
-                if name not in total_ingredients:
-                    total_ingredients[name] = (amount, measurement_unit)
-                else:
-                    total_amount, measurement_unit = total_ingredients[name]
-                    total_amount += amount
-                    total_ingredients[name] = (total_amount, measurement_unit)
-
-        for name, (amount, measurement_unit) in total_ingredients.items():
-            content += f'{name}: {amount} {measurement_unit}\n'
-
-        file_path = f'media/{request.user.email}_shopping_cart.txt'
-        with io.open(file_path, 'w', encoding='utf-8') as file:
-            file.write(content)
-
-        with open(file_path, 'rb') as file:
-            response = HttpResponse(file.read(), content_type='text/plain')
-            response['Content-Disposition'] = ('attachment; '
-                                               'filename="shopping_cart.txt"')
-
+        ingredients = RecipeIngredient.objects.filter(
+            recipe__shopping_recipe__user=request.user
+        ).values(
+            'ingredient__name', 'ingredient__measurement_unit'
+        ).annotate(
+            total_amount=Sum('amount')
+        ).order_by('ingredient__name')
+        # Запрос выполняется внутри view: ошибки базы проходят через
+        # обработчик исключений DRF, а не обрывают уже начатый ответ.
+        response = HttpResponse(
+            ''.join(f'{ingredient["ingredient__name"]}: '
+                    f'{ingredient["total_amount"]} '
+                    f'{ingredient["ingredient__measurement_unit"]}\n'
+                    for ingredient in ingredients),
+            content_type='text/plain; charset=utf-8'
+        )
+        response['Content-Disposition'] = ('attachment; '
+                                           'filename="shopping_cart.txt"')
         return response
 
     def get_serializer_class(self):
@@ -149,7 +206,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return super().get_permissions()
 
 
-class UsersViewSet(viewsets.ModelViewSet):
+class UsersViewSet(ReplicaReadMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     permission_classes = (UserPermissions,)
     pagination_class = ResponsePaginator
@@ -165,7 +222,14 @@ class UsersViewSet(viewsets.ModelViewSet):
             permission_classes=(IsAuthenticated,),
             pagination_class=None)
     def me(self, request):
-        return Response(UserGetSerializer(request.user).data)
+        # Пользователь из JWT несет только клеймы, профиль догружается
+        # одним запросом, а не по запросу на каждое поле.
+        deferred_fields = request.user.get_deferred_fields().intersection(
+            UserGetSerializer.Meta.fields)
+        if deferred_fields:
+            request.user.refresh_from_db(fields=deferred_fields)
+        return Response(UserGetSerializer(
+            request.user, context={'request': request}).data)
 
     @action(detail=True, methods=['post', 'delete'],
             permission_classes=(IsAuthenticated, IsBlockedUser))
@@ -200,9 +264,12 @@ class UsersViewSet(viewsets.ModelViewSet):
             permission_classes=(IsCurrentUserOrAdmin, IsBlockedUser))
     def subscriptions(self, request):
         subscribers = User.objects.filter(
-            following__user=request.user).all()
+            following__user=request.user
+        ).order_by('username')
         page = self.paginate_queryset(subscribers)
-        serializer = SubscriptionsGetSerializer(page, many=True)
+        attach_limited_recipes(page, get_recipes_limit(request))
+        serializer = SubscriptionsGetSerializer(
+            page, many=True, context={'request': request})
         return self.get_paginated_response(serializer.data)
 
     @action(detail=False, methods=['post'],
@@ -213,3 +280,11 @@ class UsersViewSet(viewsets.ModelViewSet):
             context={'request': request})
         serializer.is_valid(raise_exception=True)
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class MetricsView(APIView):
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return HttpResponse(metrics_store.render(),
+                            content_type='text/plain; version=0.0.4')
@@ -0,0 +1,11 @@
+from django.urls import include, path
+
+from api.async_views import async_urlpatterns
+from api.urls import router
+from . import urls
+
+# Маршруты ASGI: горячие маршруты API асинхронные, остальные совпадают
+# с foodgram_backend.urls.
+urlpatterns = [
+    path('api/', include(async_urlpatterns(router.urls))),
+] + urls.urlpatterns
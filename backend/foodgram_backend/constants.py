@@ -5,3 +5,9 @@ MAX_INGREDIENTS_LENGTH = 250
 MAX_MEASURE_LENGTH = 15
 MAX_COLOR_LENGTH = 7
 PAGE_SIZE = 6
+RECIPES_LIMIT = 3
+CATALOG_MAX_AGE = 60
+MAX_IMAGE_SIZE = 10 * 1024 * 1024
+MAX_IMAGE_SIDE = 6000
+MAX_IMAGE_NAME_LENGTH = 100
+MAX_JOB_NAME_LENGTH = 150
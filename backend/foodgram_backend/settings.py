@@ -1,6 +1,9 @@
 import os
+import tempfile
+from datetime import timedelta
 from pathlib import Path
 
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -24,14 +27,17 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'rest_framework',
     'rest_framework.authtoken',
+    'rest_framework_simplejwt.token_blacklist',
     'djoser',
     'django_filters',
     'api.apps.ApiConfig',
     'recipes.apps.RecipesConfig',
     'users.apps.UsersConfig',
+    'jobs.apps.JobsConfig',
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -61,6 +67,22 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram_backend.wsgi.application'
 
+# Общий кеш процессов: адреса memcached (host:port через запятую). На нем
+# держатся поколения справочников, кеш авторизации и страниц рецептов;
+# без него кеш Django у каждого процесса свой.
+CACHE_LOCATION = os.getenv('CACHE_LOCATION')
+if CACHE_LOCATION:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': CACHE_LOCATION.split(','),
+        }
+    }
+
+# Потоки пула асинхронных view под ASGI; не больше соединений с базой,
+# отведенных одному процессу.
+ASYNC_DB_THREADS = int(os.getenv('ASYNC_DB_THREADS', 16))
+
 if os.getenv('DB_TYPE') == 'lite':
     DATABASES = {
         'default': {
@@ -80,6 +102,35 @@ elif os.getenv('DB_TYPE') == 'postgres':
         }
     }
 
+# Реплики для чтения через запятую: файлы SQLite при DB_TYPE=lite
+# или хосты PostgreSQL (host[:port]) с теми же базой и пользователем.
+DB_REPLICAS = [name.strip() for name in
+               os.getenv('DB_REPLICAS', '').split(',') if name.strip()]
+for number, name in enumerate(DB_REPLICAS, 1):
+    replica = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    if os.getenv('DB_TYPE') == 'lite':
+        replica['NAME'] = BASE_DIR / name
+    else:
+        replica['HOST'], _, port = name.partition(':')
+        replica['PORT'] = port or replica['PORT']
+    DATABASES[f'replica_{number}'] = replica
+# Сколько секунд после записи пользователь читает из основной базы.
+DB_REPLICA_PIN_SECONDS = int(os.getenv('DB_REPLICA_PIN_SECONDS', 10))
+# Отметка о записи должна быть видна всем процессам, поэтому реплики
+# требуют общего кеша (для одного процесса подойдет и default).
+DB_REPLICA_PIN_CACHE_ALIAS = os.getenv('DB_REPLICA_PIN_CACHE_ALIAS') or (
+    'default' if CACHE_LOCATION else None)
+if DB_REPLICAS:
+    if not DB_REPLICA_PIN_CACHE_ALIAS:
+        raise ImproperlyConfigured(
+            'DB_REPLICAS требует CACHE_LOCATION или '
+            'DB_REPLICA_PIN_CACHE_ALIAS.'
+        )
+    DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+
+# token - только токены djoser, jwt - еще и JWT на api/auth/jwt/.
+AUTH_MODE = os.getenv('AUTH_MODE', 'token')
+
 REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'
@@ -88,9 +139,24 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ]
 }
+if AUTH_MODE == 'jwt':
+    REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES'].insert(
+        0, 'api.authentication.StatelessJWTAuthentication')
+
+SIMPLE_JWT = {
+    'ACCESS_TOKEN_LIFETIME': timedelta(
+        seconds=int(os.getenv('JWT_ACCESS_LIFETIME', 300))),
+    'REFRESH_TOKEN_LIFETIME': timedelta(
+        seconds=int(os.getenv('JWT_REFRESH_LIFETIME', 14 * 24 * 3600))),
+    'AUTH_HEADER_TYPES': ('Bearer',),
+    'UPDATE_LAST_LOGIN': True,
+    'TOKEN_OBTAIN_SERIALIZER': 'api.serializers.JWTObtainSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'api.serializers.JWTRefreshSerializer',
+    'TOKEN_BLACKLIST_SERIALIZER': 'api.serializers.JWTLogoutSerializer',
+}
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -122,3 +188,41 @@ USE_I18N = True
 USE_TZ = True
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+METRICS_DIR = os.getenv(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'foodgram_metrics')
+)
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', 1))
+
+JOBS_EAGER = os.getenv('JOBS_EAGER', 'false').lower() == 'true'
+JOBS_CONCURRENCY = int(os.getenv('JOBS_CONCURRENCY', 2))
+JOBS_POLL_INTERVAL = float(os.getenv('JOBS_POLL_INTERVAL', 1))
+JOBS_RETRY_DELAY = int(os.getenv('JOBS_RETRY_DELAY', 10))
+JOBS_MAX_RETRY_DELAY = int(os.getenv('JOBS_MAX_RETRY_DELAY', 3600))
+JOBS_TIMEOUT = int(os.getenv('JOBS_TIMEOUT', 600))
+JOBS_KEEP_DONE = int(os.getenv('JOBS_KEEP_DONE', 7 * 24 * 3600))
+
+# Кеш авторизации по токену живет в общем кеше, если он настроен. Без
+# него AUTH_CACHE_TTL > 0 включает кеш в памяти, годный для одного процесса.
+AUTH_CACHE_SIZE = int(os.getenv('AUTH_CACHE_SIZE', 10000))
+AUTH_CACHE_TTL = float(os.getenv('AUTH_CACHE_TTL', 0))
+AUTH_CACHE_ALIAS = os.getenv('AUTH_CACHE_ALIAS') or (
+    'default' if CACHE_LOCATION else None)
+AUTH_SHARED_CACHE_TTL = int(os.getenv('AUTH_SHARED_CACHE_TTL', 300))
+# Отозванные JWT проверяются по общему кешу: в памяти одного процесса
+# отзыв не виден остальным.
+if AUTH_MODE == 'jwt' and not AUTH_CACHE_ALIAS:
+    raise ImproperlyConfigured(
+        'AUTH_MODE=jwt требует CACHE_LOCATION или AUTH_CACHE_ALIAS.'
+    )
+
+# Кеш страниц списка рецептов для анонимов работает только в общем кеше;
+# RECIPE_PAGE_CACHE_TTL=0 отключает его.
+RECIPE_PAGE_CACHE_ALIAS = os.getenv('RECIPE_PAGE_CACHE_ALIAS') or (
+    'default' if CACHE_LOCATION else None)
+RECIPE_PAGE_CACHE_TTL = int(os.getenv('RECIPE_PAGE_CACHE_TTL', 60))
+
+# Готовые справочники тегов и ингредиентов и индекс поиска ингредиентов
+# держатся в памяти процессов, только если их поколения в общем кеше.
+CATALOG_CACHE_ALIAS = os.getenv('CATALOG_CACHE_ALIAS') or (
+    'default' if CACHE_LOCATION else None)
@@ -0,0 +1,22 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name', 'status', 'attempts', 'run_at',
+                    'created', 'finished')
+    list_filter = ('status', 'name')
+    readonly_fields = ('attempts', 'locked_at', 'locked_by', 'last_error',
+                       'created', 'finished')
+
+    def retry_jobs(self, request, queryset):
+        queryset.exclude(status=Job.RUNNING).update(
+            status=Job.PENDING, attempts=0, run_at=timezone.now(),
+            finished=None
+        )
+
+    actions = [retry_jobs]
+    retry_jobs.short_description = 'Перезапустить задачи'
@@ -0,0 +1,77 @@
+import os
+import signal
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from jobs.queue import claim, purge_finished, requeue_stale, run_job
+
+
+class Command(BaseCommand):
+    help = 'Run background jobs from the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency', type=int, default=settings.JOBS_CONCURRENCY,
+            help='Количество потоков, выполняющих задачи'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float,
+            default=settings.JOBS_POLL_INTERVAL,
+            help='Пауза в секундах, когда очередь пуста'
+        )
+        parser.add_argument(
+            '--burst', action='store_true',
+            help='Выполнить готовые задачи и завершиться'
+        )
+
+    def handle(self, *args, **options):
+        self.stop = threading.Event()
+        for signal_number in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signal_number, lambda *args: self.stop.set())
+        name = f'{socket.gethostname()}:{os.getpid()}'
+        threads = [
+            threading.Thread(target=self.work,
+                             args=(f'{name}:{number}', options))
+            for number in range(max(options['concurrency'], 1))
+        ]
+        self.stdout.write(
+            f'[!] Воркер {name} запущен, потоков: {len(threads)}.')
+        self.maintain()
+        next_maintenance = time.monotonic() + settings.JOBS_TIMEOUT / 2
+        for thread in threads:
+            thread.start()
+        while any(thread.is_alive() for thread in threads):
+            self.stop.wait(options['poll_interval'])
+            if time.monotonic() >= next_maintenance:
+                self.maintain()
+                next_maintenance += settings.JOBS_TIMEOUT / 2
+        for thread in threads:
+            thread.join()
+        connection.close()
+        self.stdout.write(f'[!] Воркер {name} остановлен.')
+
+    def maintain(self):
+        requeued, failed = requeue_stale()
+        if requeued or failed:
+            self.stdout.write(f'[!] Зависшие задачи: {requeued} возвращено '
+                              f'в очередь, {failed} завершено с ошибкой.')
+        purge_finished()
+
+    def work(self, name, options):
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                job = claim(name)
+                if job is None:
+                    if options['burst']:
+                        break
+                    self.stop.wait(options['poll_interval'])
+                    continue
+                run_job(job)
+        finally:
+            connection.close()
@@ -0,0 +1,130 @@
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# Сколько кандидатов перебирать за один захват без SKIP LOCKED.
+CLAIM_CANDIDATES = 10
+
+TASKS = {}
+
+
+def task(name):
+    def register(function):
+        TASKS[name] = function
+        return function
+
+    return register
+
+
+def enqueue(name, delay=0, **payload):
+    # Задача создается в текущей транзакции и видна воркеру только
+    # после ее фиксации вместе с остальными изменениями.
+    if name not in TASKS:
+        raise LookupError(f'Задача не зарегистрирована: {name}')
+    if settings.JOBS_EAGER:
+        transaction.on_commit(lambda: run_eagerly(name, payload))
+        return None
+    return Job.objects.create(
+        name=name, payload=payload,
+        run_at=timezone.now() + timedelta(seconds=delay)
+    )
+
+
+def run_eagerly(name, payload):
+    try:
+        TASKS[name](**payload)
+    except Exception:
+        logger.exception('Задача %s завершилась ошибкой', name)
+
+
+def claim(worker):
+    now = timezone.now()
+    pending = Job.objects.filter(
+        status=Job.PENDING, run_at__lte=now).order_by('run_at', 'id')
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = pending.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            job.status = Job.RUNNING
+            job.attempts += 1
+            job.locked_at = now
+            job.locked_by = worker
+            job.save(update_fields=('status', 'attempts', 'locked_at',
+                                    'locked_by'))
+            return job
+    # Без SKIP LOCKED задачу получает тот воркер, чей UPDATE с условием
+    # на статус изменил строку; остальные пробуют следующего кандидата.
+    for job_id in pending.values_list('id', flat=True)[:CLAIM_CANDIDATES]:
+        claimed = Job.objects.filter(id=job_id, status=Job.PENDING).update(
+            status=Job.RUNNING, attempts=F('attempts') + 1, locked_at=now,
+            locked_by=worker
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def retry_delay(attempts):
+    # Экспоненциальная задержка со случайной добавкой, чтобы повторы
+    # упавших разом задач не приходили одновременно.
+    delay = min(settings.JOBS_RETRY_DELAY * 2 ** (attempts - 1),
+                settings.JOBS_MAX_RETRY_DELAY)
+    return timedelta(seconds=delay * random.uniform(1, 1.25))
+
+
+def run_job(job):
+    try:
+        function = TASKS.get(job.name)
+        if function is None:
+            raise LookupError(f'Задача не зарегистрирована: {job.name}')
+        function(**job.payload)
+    except Exception:
+        logger.exception('Задача %s завершилась ошибкой', job)
+        now = timezone.now()
+        jobs = Job.objects.filter(id=job.id)
+        if job.attempts < job.max_attempts:
+            jobs.update(status=Job.PENDING, locked_at=None, locked_by='',
+                        run_at=now + retry_delay(job.attempts),
+                        last_error=traceback.format_exc())
+        else:
+            jobs.update(status=Job.FAILED, finished=now,
+                        last_error=traceback.format_exc())
+        return False
+    Job.objects.filter(id=job.id).update(status=Job.DONE,
+                                         finished=timezone.now())
+    return True
+
+
+def requeue_stale():
+    # Задачи воркеров, упавших посреди выполнения, возвращаются в очередь.
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.RUNNING,
+        locked_at__lt=now - timedelta(seconds=settings.JOBS_TIMEOUT)
+    )
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, finished=now,
+        last_error='Воркер не завершил задачу за отведенное время'
+    )
+    requeued = stale.update(status=Job.PENDING, locked_at=None,
+                            locked_by='', run_at=now)
+    return requeued, failed
+
+
+def purge_finished():
+    return Job.objects.filter(
+        status=Job.DONE,
+        finished__lt=timezone.now() - timedelta(
+            seconds=settings.JOBS_KEEP_DONE)
+    ).delete()[0]
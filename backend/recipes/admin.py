@@ -2,36 +2,56 @@ from django.contrib import admin
 
 from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                      ShoppingCart, Tag)
+from .search import search_recipes
 
 
 class RecipeIngredientInline(admin.TabularInline):
     model = RecipeIngredient
-
-
-class FavoriteInline(admin.TabularInline):
-    model = Favorite
+    autocomplete_fields = ('ingredient',)
     extra = 1
 
-
-class ShoppingCartInline(admin.TabularInline):
-    model = ShoppingCart
-    extra = 1
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'recipe', 'ingredient')
 
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
-    inlines = (RecipeIngredientInline, FavoriteInline, ShoppingCartInline)
+    inlines = (RecipeIngredientInline,)
     list_display = (
         'name',
-        'author'
+        'author',
+        'total_favorites'
     )
-    list_filter = ('author', 'name')
+    list_select_related = ('author',)
+    list_filter = ('tags',)
+    search_fields = ('name',)
+    raw_id_fields = ('author',)
     readonly_fields = ['total_favorites']
+    show_full_result_count = False
 
     def total_favorites(self, obj):
-        return Favorite.objects.filter(recipe=obj).count()
+        return obj.favorites_count
+
+    def get_search_results(self, request, queryset, search_term):
+        # Поиск по полнотекстовому индексу вместо LIKE по всей таблице.
+        if not search_term:
+            return queryset, False
+        return search_recipes(queryset, search_term), False
 
     total_favorites.short_description = 'В избранном у'
+    total_favorites.admin_order_field = 'favorites_count'
+
+
+class UserRecipeAdmin(admin.ModelAdmin):
+    list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    raw_id_fields = ('user', 'recipe')
+    show_full_result_count = False
+
+
+admin.site.register(Favorite, UserRecipeAdmin)
+admin.site.register(ShoppingCart, UserRecipeAdmin)
 
 
 @admin.register(Tag)
@@ -51,4 +71,6 @@ class IngredientAdmin(admin.ModelAdmin):
         'name',
         'measurement_unit',
     )
-    list_filter = ('name',)
+    list_filter = ('measurement_unit',)
+    search_fields = ('^name',)
+    show_full_result_count = False
@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from users.models import Subscription
+from .models import Favorite, Recipe
+
+User = get_user_model()
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Subscription, 'author'),
+)
+
+
+def change_counter(model, pk, field, delta):
+    # Атомарное изменение счетчика в базе, без чтения строки в Python.
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def recount_field(model, field, related_model, related_field):
+    # Исправляет только разошедшиеся строки и возвращает их количество.
+    # Принимает и исторические модели, поэтому подходит для миграций.
+    actual = Coalesce(Subquery(
+        related_model.objects.filter(
+            **{related_field: OuterRef('pk')}
+        ).order_by().values(related_field).annotate(
+            count=Count('pk')
+        ).values('count')
+    ), 0)
+    return model.objects.exclude(**{field: actual}).update(**{field: actual})
+
+
+def recount():
+    return {
+        f'{model._meta.model_name}.{field}': recount_field(
+            model, field, related_model, related_field)
+        for model, field, related_model, related_field in COUNTERS
+    }
@@ -0,0 +1,71 @@
+import hashlib
+import io
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+RENDITIONS_DIR = 'recipes/renditions'
+
+# Размер и режим: crop обрезает под пропорции карточки, fit вписывает.
+RENDITIONS = {
+    'thumbnail': ((240, 160), 'crop'),
+    'card': ((726, 480), 'crop'),
+    'full': ((1600, 1600), 'fit'),
+}
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def rendition_name(image_name, size, image_format):
+    # Хеш полного пути в хранилище: картинки с одинаковым именем файла
+    # в разных папках не делят копии.
+    base = os.path.splitext(os.path.basename(image_name))[0]
+    digest = hashlib.sha1(image_name.encode()).hexdigest()[:12]
+    return f'{RENDITIONS_DIR}/{base}-{digest}_{size}.{image_format}'
+
+
+def rendition_names(image_name):
+    return [rendition_name(image_name, size, image_format)
+            for size in RENDITIONS for image_format in FORMATS]
+
+
+def create_renditions(image_name):
+    with default_storage.open(image_name, 'rb') as file:
+        original = ImageOps.exif_transpose(Image.open(file))
+        original = original.convert('RGB')
+    for size, (box, mode) in RENDITIONS.items():
+        if mode == 'crop':
+            image = ImageOps.fit(original, box, Image.LANCZOS)
+        else:
+            image = original.copy()
+            image.thumbnail(box, Image.LANCZOS)
+        for image_format, (pil_format, options) in FORMATS.items():
+            buffer = io.BytesIO()
+            image.save(buffer, pil_format, **options)
+            name = rendition_name(image_name, size, image_format)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def delete_renditions(image_name):
+    for name in rendition_names(image_name):
+        if default_storage.exists(name):
+            default_storage.delete(name)
+
+
+def rendition_urls(image_name, request=None):
+    def url(name):
+        url = default_storage.url(name)
+        return request.build_absolute_uri(url) if request else url
+
+    return {
+        size: {image_format: url(rendition_name(image_name, size,
+                                                image_format))
+               for image_format in FORMATS}
+        for size in RENDITIONS
+    }
@@ -0,0 +1,45 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from progress.bar import IncrementalBar
+
+from recipes.images import create_renditions, rendition_names
+from recipes.models import Recipe
+from recipes.signals import recipes_changed
+
+
+class Command(BaseCommand):
+    help = "Create missing image renditions for existing recipes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать копии, даже если они уже есть'
+        )
+
+    def handle(self, *args, **options):
+        images = list(Recipe.objects.exclude(image='').values_list(
+            'image', flat=True).distinct())
+        bar = IncrementalBar('renditions'.ljust(17), max=len(images))
+        created = failed = marked = 0
+        for image in images:
+            bar.next()
+            if options['force'] or not all(
+                default_storage.exists(name)
+                for name in rendition_names(image)
+            ):
+                try:
+                    create_renditions(image)
+                except OSError:
+                    failed += 1
+                    continue
+                created += 1
+            # Как и задача update_renditions: API отдает ссылки на копии
+            # только рецептам с отметкой, в том числе созданным до нее.
+            marked += Recipe.objects.filter(image=image).exclude(
+                renditions_image=image).update(renditions_image=image)
+        bar.finish()
+        if marked:
+            transaction.on_commit(lambda: recipes_changed.send(sender=Recipe))
+        self.stdout.write(
+            f"[!] Копии изображений созданы: {created}, ошибок: {failed}.")
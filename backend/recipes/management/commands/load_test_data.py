@@ -1,63 +1,166 @@
 import csv
+import io
+import json
 import os
+import random
+from itertools import islice
 
 from django.contrib.auth import get_user_model
-from django.core.management.base import BaseCommand
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from PIL import Image
 from progress.bar import IncrementalBar
 
 from foodgram_backend import settings
-from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.counters import recount
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from recipes.signals import recipes_changed
+from users.models import Subscription
 
 User = get_user_model()
 
+BATCH_SIZE = 1000
+PLACEHOLDER_IMAGE = 'recipes/placeholder.jpg'
+TAG_FIELDS = ('name', 'color', 'slug')
+INGREDIENT_FIELDS = ('name', 'measurement_unit')
 
-def ingredient_create(row):
-    Ingredient.objects.get_or_create(
-        name=row[0],
-        measurement_unit=row[1]
-    )
+
+def read_rows(path, fields, has_header=False):
+    if path.endswith('.json'):
+        with open(path, 'r', encoding='utf-8') as file:
+            return [tuple(item[field] for field in fields)
+                    for item in json.load(file)]
+    with open(path, 'r', encoding='utf-8') as file:
+        reader = csv.reader(file)
+        if has_header:
+            next(reader)
+        return [tuple(row[:len(fields)]) for row in reader if row]
+
+
+def unique_by_first_field(rows):
+    unique_rows = {}
+    for row in rows:
+        unique_rows.setdefault(row[0], row)
+    return list(unique_rows.values())
+
+
+def copy_rows(model, fields, rows):
+    # COPY во временную таблицу и перенос без конфликтующих строк.
+    table = model._meta.db_table
+    columns = ', '.join(fields)
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE TEMP TABLE import_{table} ON COMMIT DROP AS '
+            f'SELECT {columns} FROM {table} WITH NO DATA'
+        )
+        cursor.copy_expert(
+            f'COPY import_{table} ({columns}) FROM STDIN WITH (FORMAT csv)',
+            buffer
+        )
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) '
+            f'SELECT {columns} FROM import_{table} ON CONFLICT DO NOTHING'
+        )
+
+
+def upsert_rows(model, fields, rows):
+    before = model.objects.count()
+    if connection.vendor == 'postgresql':
+        copy_rows(model, fields, rows)
+    else:
+        model.objects.bulk_create(
+            (model(**dict(zip(fields, row))) for row in rows),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True
+        )
+    return model.objects.count() - before
 
 
-def tags_create(row):
-    Tag.objects.get_or_create(
-        name=row[0],
-        color=row[1],
-        slug=row[2]
-    )
+def batches(iterable, size=BATCH_SIZE):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def bulk_insert(model, objects, label, total):
+    bar = IncrementalBar(label.ljust(17), max=max(total // BATCH_SIZE, 1))
+    for batch in batches(objects):
+        model.objects.bulk_create(batch, ignore_conflicts=True)
+        bar.next()
+    bar.finish()
+
+
+def popularity(count, rng):
+    # Парето-распределение: немногие объекты собирают большую часть
+    # рецептов, подписок и избранного, как на живом сайте.
+    return [rng.paretovariate(1.2) for _ in range(count)]
+
+
+def placeholder_image():
+    if not default_storage.exists(PLACEHOLDER_IMAGE):
+        buffer = io.BytesIO()
+        Image.new('RGB', (600, 400), '#E26C2D').save(buffer, 'JPEG')
+        default_storage.save(PLACEHOLDER_IMAGE,
+                             ContentFile(buffer.getvalue()))
+    return PLACEHOLDER_IMAGE
 
 
 class Command(BaseCommand):
-    help = "Load ingredients to DB"
+    help = "Load ingredients and tags to DB, optionally generate test data"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ingredients',
+            default=os.path.join(settings.BASE_DIR, 'ingredients.csv'),
+            help='CSV (name,measurement_unit) или JSON с ингредиентами'
+        )
+        parser.add_argument(
+            '--tags',
+            default=os.path.join(settings.BASE_DIR, 'tags.csv'),
+            help='CSV (name,color,slug) с заголовком или JSON с тегами'
+        )
+        parser.add_argument(
+            '--scale', action='store_true',
+            help='Сгенерировать пользователей, рецепты, подписки, '
+                 'избранное и корзины'
+        )
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=None)
 
     def handle(self, *args, **options):
-        path = os.path.join(settings.BASE_DIR, 'ingredients.csv')
-        with open(path, 'r', encoding='utf-8') as file:
-            row_count = sum(1 for row in file)
-        with open(path, 'r', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            bar = IncrementalBar('ingredients.csv'.ljust(17), max=row_count)
-            next(reader)
-            for row in reader:
-                bar.next()
-                ingredient_create(row)
-            bar.finish()
-        self.stdout.write("[!] Ингредиенты успешно загружены.")
+        for path in (options['ingredients'], options['tags']):
+            if not os.path.exists(path):
+                raise CommandError(f'Файл не найден: {path}')
 
-        path = os.path.join(settings.BASE_DIR, 'tags.csv')
-        with open(path, 'r', encoding='utf-8') as file:
-            row_count = sum(1 for row in file)
-        with open(path, 'r', encoding='utf-8') as file:
-            reader = csv.reader(file)
-            bar = IncrementalBar('tags.csv'.ljust(17), max=row_count)
-            next(reader)
-            for row in reader:
-                bar.next()
-                tags_create(row)
-            bar.finish()
-        self.stdout.write("[!] Теги успешно загружены.")
-
-        if not User.objects.filter(username='admin').exists():
-            User.objects.create_superuser(
+        rows = unique_by_first_field(
+            read_rows(options['ingredients'], INGREDIENT_FIELDS))
+        created = upsert_rows(Ingredient, INGREDIENT_FIELDS, rows)
+        self.stdout.write(
+            f"[!] Ингредиенты успешно загружены: {created} новых.")
+
+        rows = unique_by_first_field(
+            read_rows(options['tags'], TAG_FIELDS, has_header=True))
+        created = upsert_rows(Tag, TAG_FIELDS, rows)
+        self.stdout.write(f"[!] Теги успешно загружены: {created} новых.")
+
+        self.create_demo_accounts()
+
+        if options['scale']:
+            self.generate(options['users'], options['recipes'],
+                          random.Random(options['seed']))
+
+    def create_demo_accounts(self):
+        admin = User.objects.filter(username='admin').first()
+        if admin is None:
+            admin = User.objects.create_superuser(
                 username='admin', email='admin@example.com',
                 password='adminpassword', first_name='admin',
                 last_name='admin'
@@ -65,28 +168,24 @@ class Command(BaseCommand):
         self.stdout.write("[!] Учетная запись админа успешно создана.")
         if not Recipe.objects.filter(name='Рецепт админа').exists():
             admin_recipe = Recipe.objects.create(
-                author=User.objects.get(id=1),
+                author=admin,
                 name='Рецепт админа',
-                image='image.jpg',
+                image=placeholder_image(),
                 text='Описание рецепта админа',
                 cooking_time=10
             )
-            admin_recipe.tags.set(
-                Tag.objects.all().values_list('id', flat=True))
-            RecipeIngredient.objects.create(
-                recipe=admin_recipe,
-                ingredient=Ingredient.objects.get(id=111),
-                amount=100
-            )
-            RecipeIngredient.objects.create(
-                recipe=admin_recipe,
-                ingredient=Ingredient.objects.get(id=222),
-                amount=200
+            admin_recipe.tags.set(Tag.objects.all())
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=admin_recipe, ingredient=ingredient,
+                                 amount=amount)
+                for ingredient, amount in zip(
+                    Ingredient.objects.all()[:2], (100, 200))
             )
         self.stdout.write("[!] Рецепт админа успешно создан.")
 
-        if not User.objects.filter(username='user').exists():
-            User.objects.create_user(
+        user = User.objects.filter(username='user').first()
+        if user is None:
+            user = User.objects.create_user(
                 username='user', email='user@example.com',
                 password='userpassword', first_name='user',
                 last_name='user'
@@ -94,26 +193,96 @@ class Command(BaseCommand):
         self.stdout.write("[!] Учетная запись пользователя успешно создана.")
         if not Recipe.objects.filter(name='Рецепт пользователя').exists():
             user_recipe = Recipe.objects.create(
-                author=User.objects.get(id=2),
+                author=user,
                 name='Рецепт пользователя',
-                image='image1.jpg',
+                image=placeholder_image(),
                 text='Описание рецепта пользователя',
                 cooking_time=10
             )
-            user_recipe.tags.set([1])
-            RecipeIngredient.objects.create(
-                recipe=user_recipe,
-                ingredient=Ingredient.objects.get(id=100),
-                amount=111
-            )
-            RecipeIngredient.objects.create(
-                recipe=user_recipe,
-                ingredient=Ingredient.objects.get(id=200),
-                amount=222
-            )
-            RecipeIngredient.objects.create(
-                recipe=user_recipe,
-                ingredient=Ingredient.objects.get(id=300),
-                amount=333
+            user_recipe.tags.set(Tag.objects.all()[:1])
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=user_recipe, ingredient=ingredient,
+                                 amount=amount)
+                for ingredient, amount in zip(
+                    Ingredient.objects.all()[2:5], (111, 222, 333))
             )
         self.stdout.write("[!] Рецепт пользователя успешно создан.")
+
+    @transaction.atomic
+    def generate(self, users_count, recipes_count, rng):
+        tag_ids = list(Tag.objects.values_list('id', flat=True))
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if not tag_ids or not ingredient_ids:
+            raise CommandError('Сначала загрузите теги и ингредиенты.')
+        image = placeholder_image()
+        password = make_password('testpassword')
+        prefix = f'load{rng.randrange(10 ** 6)}'
+
+        last_user_id = User.objects.order_by('-id').values_list(
+            'id', flat=True).first() or 0
+        bulk_insert(User, (
+            User(username=f'{prefix}_{number}',
+                 email=f'{prefix}_{number}@example.com',
+                 first_name='Тест', last_name=f'Пользователь {number}',
+                 password=password)
+            for number in range(users_count)
+        ), 'users', users_count)
+        user_ids = list(User.objects.filter(id__gt=last_user_id).values_list(
+            'id', flat=True))
+        self.stdout.write(f"[!] Пользователи созданы: {len(user_ids)}.")
+        if not user_ids:
+            return
+
+        author_weights = popularity(len(user_ids), rng)
+        last_recipe_id = Recipe.objects.order_by('-id').values_list(
+            'id', flat=True).first() or 0
+        bulk_insert(Recipe, (
+            Recipe(author_id=author_id,
+                   name=f'Рецепт {number}',
+                   text=f'Описание тестового рецепта {number}',
+                   image=image,
+                   cooking_time=rng.randint(5, 180))
+            for number, author_id in enumerate(rng.choices(
+                user_ids, author_weights, k=recipes_count))
+        ), 'recipes', recipes_count)
+        recipe_ids = list(Recipe.objects.filter(
+            id__gt=last_recipe_id).values_list('id', flat=True))
+        self.stdout.write(f"[!] Рецепты созданы: {len(recipe_ids)}.")
+        if not recipe_ids:
+            return
+
+        bulk_insert(Recipe.tags.through, (
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in rng.sample(tag_ids, rng.randint(1, len(tag_ids)))
+        ), 'recipe tags', len(recipe_ids) * 2)
+        bulk_insert(RecipeIngredient, (
+            RecipeIngredient(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                             amount=rng.randint(1, 50) * 10)
+            for recipe_id in recipe_ids
+            for ingredient_id in rng.sample(
+                ingredient_ids, min(rng.randint(3, 15), len(ingredient_ids)))
+        ), 'ingredients', len(recipe_ids) * 9)
+
+        recipe_weights = popularity(len(recipe_ids), rng)
+        for model, label, mean in ((Favorite, 'favorites', 10),
+                                   (ShoppingCart, 'shopping carts', 3)):
+            bulk_insert(model, (
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id in user_ids
+                for recipe_id in set(rng.choices(
+                    recipe_ids, recipe_weights,
+                    k=int(rng.expovariate(1 / mean))))
+            ), label, len(user_ids) * mean)
+        bulk_insert(Subscription, (
+            Subscription(user_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in set(rng.choices(
+                user_ids, author_weights, k=int(rng.expovariate(1 / 5))))
+            if author_id != user_id
+        ), 'subscriptions', len(user_ids) * 5)
+        # bulk_create не отправляет сигналы, счетчики считаются заново,
+        # а закешированные страницы рецептов сбрасываются.
+        recount()
+        transaction.on_commit(lambda: recipes_changed.send(sender=Recipe))
+        self.stdout.write("[!] Тестовые данные успешно сгенерированы.")
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from jobs.queue import enqueue
+from recipes.counters import recount
+
+
+class Command(BaseCommand):
+    help = "Recount denormalized favorites, recipes and subscribers counters"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--enqueue', action='store_true',
+            help='Поставить пересчет в очередь фоновых задач'
+        )
+
+    def handle(self, *args, **options):
+        if options['enqueue']:
+            enqueue('recipes.recount')
+            self.stdout.write("[!] Пересчет счетчиков поставлен в очередь.")
+            return
+        with transaction.atomic():
+            fixed = recount()
+        for counter, rows in fixed.items():
+            self.stdout.write(f"[!] {counter}: исправлено строк: {rows}.")
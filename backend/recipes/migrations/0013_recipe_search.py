@@ -0,0 +1,14 @@
+from django.db import migrations
+
+from recipes.search import install, uninstall
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_alter_ingredient_options_alter_recipe_options_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations, models
+
+from recipes.counters import recount_field
+from recipes.search import restore_sqlite_triggers
+
+
+def count_favorites_and_recipes(apps, schema_editor):
+    recount_field(apps.get_model('recipes', 'Recipe'), 'favorites_count',
+                  apps.get_model('recipes', 'Favorite'), 'recipe')
+    recount_field(apps.get_model('users', 'MyUser'), 'recipes_count',
+                  apps.get_model('recipes', 'Recipe'), 'author')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_search'),
+        ('users', '0013_myuser_counters'),
+    ]
+
+    operations = [
+        # При откате триггеры восстанавливаются после удаления поля.
+        migrations.RunPython(migrations.RunPython.noop,
+                             restore_sqlite_triggers),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Счетчик добавлений в избранное', verbose_name='В избранном у'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipe_popularity_idx'),
+        ),
+        migrations.RunPython(restore_sqlite_triggers,
+                             migrations.RunPython.noop),
+        migrations.RunPython(count_favorites_and_recipes,
+                             migrations.RunPython.noop),
+    ]
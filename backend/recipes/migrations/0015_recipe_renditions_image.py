@@ -0,0 +1,38 @@
+from django.db import migrations, models
+
+from recipes.search import restore_sqlite_triggers
+
+
+def enqueue_renditions(apps, schema_editor):
+    # Копии получают новые имена, поэтому пересоздаются воркером для
+    # каждой картинки; до этого API отдает оригиналы.
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Job = apps.get_model('jobs', 'Job')
+    Job.objects.bulk_create(
+        Job(name='recipes.update_renditions', payload={'image': image})
+        for image in Recipe.objects.exclude(image='').values_list(
+            'image', flat=True).distinct().iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_recipe_favorites_count'),
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        # При откате триггеры восстанавливаются после удаления поля.
+        migrations.RunPython(migrations.RunPython.noop,
+                             restore_sqlite_triggers),
+        migrations.AddField(
+            model_name='recipe',
+            name='renditions_image',
+            field=models.CharField(blank=True, editable=False, help_text='Картинка, для которой воркер записал уменьшенные копии', max_length=100, verbose_name='Картинка с готовыми копиями'),
+        ),
+        migrations.RunPython(restore_sqlite_triggers,
+                             migrations.RunPython.noop),
+        migrations.RunPython(enqueue_renditions,
+                             migrations.RunPython.noop),
+    ]
@@ -3,6 +3,7 @@ from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
 
 from foodgram_backend.constants import (MAX_COLOR_LENGTH,
+                                        MAX_IMAGE_NAME_LENGTH,
                                         MAX_INGREDIENTS_LENGTH,
                                         MAX_MEASURE_LENGTH, MAX_RECIPES_LENGTH,
                                         MAX_TAGS_LENGTH)
@@ -25,9 +26,17 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/',
+        max_length=MAX_IMAGE_NAME_LENGTH,
         verbose_name='Картинка',
         help_text='Картинка рецепта'
     )
+    renditions_image = models.CharField(
+        max_length=MAX_IMAGE_NAME_LENGTH,
+        blank=True,
+        editable=False,
+        verbose_name='Картинка с готовыми копиями',
+        help_text='Картинка, для которой воркер записал уменьшенные копии'
+    )
     text = models.TextField(
         verbose_name='Описание',
         help_text='Описание рецепта'
@@ -53,11 +62,21 @@ class Recipe(models.Model):
         verbose_name='Ингредиенты',
         help_text='Ингредиенты рецепта'
     )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном у',
+        help_text='Счетчик добавлений в избранное'
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-id',)
+        indexes = [
+            models.Index(fields=('-favorites_count', '-id'),
+                         name='recipe_popularity_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -0,0 +1,271 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+# Полнотекстовый поиск по названию, описанию и ингредиентам рецепта.
+# В PostgreSQL поддерживается колонка tsvector с GIN-индексом, в SQLite
+# теневая таблица FTS5. Обе обновляются триггерами базы данных.
+
+POSTGRES_INSTALL = (
+    '''
+    ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector;
+    ''',
+    '''
+    CREATE INDEX recipes_recipe_search_vector_gin
+        ON recipes_recipe USING gin (search_vector);
+    ''',
+    '''
+    CREATE FUNCTION recipes_recipe_search_vector(
+        recipe_id bigint, recipe_name text, recipe_text text
+    ) RETURNS tsvector AS $$
+        SELECT setweight(to_tsvector('russian', coalesce(recipe_name, '')),
+                         'A')
+            || setweight(to_tsvector('russian', coalesce((
+                SELECT string_agg(i.name, ' ')
+                FROM recipes_recipeingredient ri
+                JOIN recipes_ingredient i ON i.id = ri.ingredient_id
+                WHERE ri.recipe_id = $1
+            ), '')), 'B')
+            || setweight(to_tsvector('russian', coalesce(recipe_text, '')),
+                         'C')
+    $$ LANGUAGE sql STABLE;
+    ''',
+    '''
+    CREATE FUNCTION recipes_recipe_search_trigger() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector := recipes_recipe_search_vector(
+            NEW.id, NEW.name, NEW.text);
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql;
+    ''',
+    '''
+    CREATE TRIGGER recipes_recipe_search
+        BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe
+        FOR EACH ROW EXECUTE PROCEDURE recipes_recipe_search_trigger();
+    ''',
+    '''
+    CREATE FUNCTION recipes_recipeingredient_search_trigger()
+    RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            UPDATE recipes_recipe r SET search_vector =
+                recipes_recipe_search_vector(r.id, r.name, r.text)
+            WHERE r.id IN (SELECT recipe_id FROM new_rows);
+        ELSIF TG_OP = 'DELETE' THEN
+            UPDATE recipes_recipe r SET search_vector =
+                recipes_recipe_search_vector(r.id, r.name, r.text)
+            WHERE r.id IN (SELECT recipe_id FROM old_rows);
+        ELSE
+            UPDATE recipes_recipe r SET search_vector =
+                recipes_recipe_search_vector(r.id, r.name, r.text)
+            WHERE r.id IN (SELECT recipe_id FROM new_rows
+                           UNION SELECT recipe_id FROM old_rows);
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+    ''',
+    '''
+    CREATE TRIGGER recipes_recipeingredient_search_insert
+        AFTER INSERT ON recipes_recipeingredient
+        REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT
+        EXECUTE PROCEDURE recipes_recipeingredient_search_trigger();
+    ''',
+    '''
+    CREATE TRIGGER recipes_recipeingredient_search_update
+        AFTER UPDATE ON recipes_recipeingredient
+        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT
+        EXECUTE PROCEDURE recipes_recipeingredient_search_trigger();
+    ''',
+    '''
+    CREATE TRIGGER recipes_recipeingredient_search_delete
+        AFTER DELETE ON recipes_recipeingredient
+        REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT
+        EXECUTE PROCEDURE recipes_recipeingredient_search_trigger();
+    ''',
+    '''
+    CREATE FUNCTION recipes_ingredient_search_trigger() RETURNS trigger AS $$
+    BEGIN
+        UPDATE recipes_recipe r SET search_vector =
+            recipes_recipe_search_vector(r.id, r.name, r.text)
+        WHERE r.id IN (SELECT recipe_id FROM recipes_recipeingredient
+                       WHERE ingredient_id = NEW.id);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql;
+    ''',
+    '''
+    CREATE TRIGGER recipes_ingredient_search
+        AFTER UPDATE OF name ON recipes_ingredient
+        FOR EACH ROW EXECUTE PROCEDURE recipes_ingredient_search_trigger();
+    ''',
+    '''
+    UPDATE recipes_recipe
+    SET search_vector = recipes_recipe_search_vector(id, name, text);
+    ''',
+)
+
+POSTGRES_UNINSTALL = (
+    'DROP TRIGGER recipes_ingredient_search ON recipes_ingredient;',
+    'DROP FUNCTION recipes_ingredient_search_trigger();',
+    '''
+    DROP TRIGGER recipes_recipeingredient_search_insert
+        ON recipes_recipeingredient;
+    ''',
+    '''
+    DROP TRIGGER recipes_recipeingredient_search_update
+        ON recipes_recipeingredient;
+    ''',
+    '''
+    DROP TRIGGER recipes_recipeingredient_search_delete
+        ON recipes_recipeingredient;
+    ''',
+    'DROP FUNCTION recipes_recipeingredient_search_trigger();',
+    'DROP TRIGGER recipes_recipe_search ON recipes_recipe;',
+    'DROP FUNCTION recipes_recipe_search_trigger();',
+    'DROP FUNCTION recipes_recipe_search_vector(bigint, text, text);',
+    'ALTER TABLE recipes_recipe DROP COLUMN search_vector;',
+)
+
+SQLITE_INGREDIENTS = '''
+    (SELECT group_concat(i.name, ' ')
+     FROM recipes_recipeingredient ri
+     JOIN recipes_ingredient i ON i.id = ri.ingredient_id
+     WHERE ri.recipe_id = {recipe_id})
+'''
+
+SQLITE_TRIGGERS = {
+    'recipes_recipe_fts_insert': '''
+    CREATE TRIGGER recipes_recipe_fts_insert
+    AFTER INSERT ON recipes_recipe BEGIN
+        INSERT INTO recipes_recipe_fts (rowid, name, text, ingredients)
+        VALUES (NEW.id, NEW.name, NEW.text, '');
+    END;
+    ''',
+    'recipes_recipe_fts_update': '''
+    CREATE TRIGGER recipes_recipe_fts_update
+    AFTER UPDATE OF name, text ON recipes_recipe BEGIN
+        UPDATE recipes_recipe_fts SET name = NEW.name, text = NEW.text
+        WHERE rowid = NEW.id;
+    END;
+    ''',
+    'recipes_recipe_fts_delete': '''
+    CREATE TRIGGER recipes_recipe_fts_delete
+    AFTER DELETE ON recipes_recipe BEGIN
+        DELETE FROM recipes_recipe_fts WHERE rowid = OLD.id;
+    END;
+    ''',
+    'recipes_recipeingredient_fts_insert': f'''
+    CREATE TRIGGER recipes_recipeingredient_fts_insert
+    AFTER INSERT ON recipes_recipeingredient BEGIN
+        UPDATE recipes_recipe_fts SET ingredients =
+            {SQLITE_INGREDIENTS.format(recipe_id='NEW.recipe_id')}
+        WHERE rowid = NEW.recipe_id;
+    END;
+    ''',
+    'recipes_recipeingredient_fts_update': f'''
+    CREATE TRIGGER recipes_recipeingredient_fts_update
+    AFTER UPDATE OF recipe_id, ingredient_id ON recipes_recipeingredient
+    BEGIN
+        UPDATE recipes_recipe_fts SET ingredients =
+            {SQLITE_INGREDIENTS.format(recipe_id='recipes_recipe_fts.rowid')}
+        WHERE rowid IN (NEW.recipe_id, OLD.recipe_id);
+    END;
+    ''',
+    'recipes_recipeingredient_fts_delete': f'''
+    CREATE TRIGGER recipes_recipeingredient_fts_delete
+    AFTER DELETE ON recipes_recipeingredient BEGIN
+        UPDATE recipes_recipe_fts SET ingredients =
+            {SQLITE_INGREDIENTS.format(recipe_id='OLD.recipe_id')}
+        WHERE rowid = OLD.recipe_id;
+    END;
+    ''',
+    'recipes_ingredient_fts_update': f'''
+    CREATE TRIGGER recipes_ingredient_fts_update
+    AFTER UPDATE OF name ON recipes_ingredient BEGIN
+        UPDATE recipes_recipe_fts SET ingredients =
+            {SQLITE_INGREDIENTS.format(recipe_id='recipes_recipe_fts.rowid')}
+        WHERE rowid IN (SELECT recipe_id FROM recipes_recipeingredient
+                        WHERE ingredient_id = NEW.id);
+    END;
+    ''',
+}
+
+SQLITE_INSTALL = (
+    '''
+    CREATE VIRTUAL TABLE recipes_recipe_fts
+        USING fts5(name, text, ingredients);
+    ''',
+    *SQLITE_TRIGGERS.values(),
+    f'''
+    INSERT INTO recipes_recipe_fts (rowid, name, text, ingredients)
+    SELECT id, name, text, coalesce(
+        {SQLITE_INGREDIENTS.format(recipe_id='recipes_recipe.id')}, '')
+    FROM recipes_recipe;
+    ''',
+)
+
+SQLITE_UNINSTALL = (
+    *(f'DROP TRIGGER {name};' for name in SQLITE_TRIGGERS),
+    'DROP TABLE recipes_recipe_fts;',
+)
+
+INSTALL = {'postgresql': POSTGRES_INSTALL, 'sqlite': SQLITE_INSTALL}
+UNINSTALL = {'postgresql': POSTGRES_UNINSTALL, 'sqlite': SQLITE_UNINSTALL}
+
+# Веса полей для bm25 в FTS5: название, описание, ингредиенты.
+SQLITE_RANK = 'bm25(recipes_recipe_fts, 10.0, 1.0, 5.0)'
+
+
+def install(apps, schema_editor):
+    for statement in INSTALL.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(statement)
+
+
+def uninstall(apps, schema_editor):
+    for statement in UNINSTALL.get(schema_editor.connection.vendor, ()):
+        schema_editor.execute(statement)
+
+
+def restore_sqlite_triggers(apps, schema_editor):
+    # SQLite пересоздает таблицу при изменении полей модели и удаляет ее
+    # триггеры, поэтому такие миграции должны вызывать эту функцию.
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name, statement in SQLITE_TRIGGERS.items():
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {name};')
+        schema_editor.execute(statement)
+
+
+def search_recipes(queryset, query):
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        tsquery = "plainto_tsquery('russian', %s)"
+        return queryset.filter(RawSQL(
+            f'recipes_recipe.search_vector @@ {tsquery}',
+            (query,), output_field=BooleanField()
+        )).annotate(search_rank=RawSQL(
+            f'ts_rank(recipes_recipe.search_vector, {tsquery})',
+            (query,), output_field=FloatField()
+        )).order_by('-search_rank', '-id')
+    if vendor == 'sqlite':
+        terms = re.findall(r'\w+', query)
+        if not terms:
+            return queryset.none()
+        match = ' '.join(f'"{term}"*' for term in terms)
+        # Соединение с FTS5 вместо коррелированного подзапроса: bm25
+        # считается за один проход полнотекстового индекса.
+        return queryset.extra(
+            tables=['recipes_recipe_fts'],
+            where=['recipes_recipe_fts.rowid = recipes_recipe.id',
+                   'recipes_recipe_fts MATCH %s'],
+            params=[match],
+            select={'search_rank': f'-{SQLITE_RANK}'},
+        ).order_by('-search_rank', '-id')
+    return queryset.filter(name__icontains=query)
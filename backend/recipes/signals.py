@@ -0,0 +1,68 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from jobs.queue import enqueue
+from .counters import change_counter
+from .models import Favorite, Recipe
+
+User = get_user_model()
+
+# Отправляется после коммита изменений рецептов в обход сигналов
+# сохранения (bulk-операции, update()), чтобы сбросить кеши страниц.
+recipes_changed = Signal()
+
+
+@receiver(pre_save, sender=Recipe)
+def remember_previous_state(sender, instance, update_fields=None,
+                            **kwargs):
+    instance._previous_image = None
+    instance._previous_author_id = None
+    if instance.pk and (update_fields is None
+                        or {'image', 'author'} & set(update_fields)):
+        previous = sender.objects.filter(pk=instance.pk).values_list(
+            'image', 'author_id').first()
+        if previous:
+            instance._previous_image, instance._previous_author_id = previous
+
+
+@receiver(post_save, sender=Recipe)
+def update_renditions(sender, instance, created, **kwargs):
+    previous_image = getattr(instance, '_previous_image', None)
+    image = instance.image.name
+    if not image or (not created and previous_image in (None, image)):
+        return
+    enqueue('recipes.update_renditions', image=image,
+            previous_image=previous_image)
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipes_count(sender, instance, created, **kwargs):
+    previous_author_id = getattr(instance, '_previous_author_id', None)
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+    elif previous_author_id not in (None, instance.author_id):
+        change_counter(User, previous_author_id, 'recipes_count', -1)
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_renditions(sender, instance, **kwargs):
+    if instance.image.name:
+        enqueue('recipes.delete_renditions', image=instance.image.name)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrease_recipes_count(sender, instance, **kwargs):
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Favorite)
+def increase_favorites_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, 'favorites_count', 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def decrease_favorites_count(sender, instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, 'favorites_count', -1)
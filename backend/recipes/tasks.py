@@ -0,0 +1,34 @@
+from django.db import transaction
+
+from jobs.queue import task
+from .counters import recount
+from .images import create_renditions, delete_renditions
+from .models import Recipe
+from .signals import recipes_changed
+
+
+def delete_unused_renditions(image):
+    # Одну картинку могут делить несколько рецептов, например заглушка
+    # тестовых данных: копии удаляются вместе с последним из них.
+    if not Recipe.objects.filter(image=image).exists():
+        delete_renditions(image)
+
+
+@task('recipes.update_renditions')
+def update_renditions(image, previous_image=None):
+    if previous_image:
+        delete_unused_renditions(previous_image)
+    create_renditions(image)
+    # API отдает ссылки на копии только после того, как файлы записаны.
+    Recipe.objects.filter(image=image).update(renditions_image=image)
+    transaction.on_commit(lambda: recipes_changed.send(sender=Recipe))
+
+
+@task('recipes.delete_renditions')
+def remove_renditions(image):
+    delete_unused_renditions(image)
+
+
+@task('recipes.recount')
+def recount_counters():
+    recount()
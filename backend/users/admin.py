@@ -1,9 +1,9 @@
 from django.contrib import admin
-from django.contrib.auth.models import Group
+from django.contrib.auth.models import Group, Permission
 from rest_framework.authtoken.models import TokenProxy as Token
 
-from recipes.models import Recipe
-from .models import MyUser, Subscription
+from .blocking import set_blocked
+from .models import MyUser
 
 admin.site.unregister(Group)
 admin.site.unregister(Token)
@@ -12,25 +12,50 @@ admin.site.unregister(Token)
 @admin.register(MyUser)
 class MyUserAdmin(admin.ModelAdmin):
     list_display = ('username', 'email',
-                    'first_name', 'last_name', 'is_blocked')
-    list_filter = ('email', 'username')
+                    'first_name', 'last_name', 'is_blocked',
+                    'total_recipes', 'total_subscribers')
+    list_filter = ('is_blocked', 'is_staff')
+    search_fields = ('=username', '=email')
+    show_full_result_count = False
 
     def total_subscribers(self, obj):
-        return Subscription.objects.filter(author=obj).count()
+        return obj.subscribers_count
 
     def total_recipes(self, obj):
-        return Recipe.objects.filter(author=obj).count()
+        return obj.recipes_count
+
+    def get_search_results(self, request, queryset, search_term):
+        # Точное совпадение по уникальным полям использует их индексы.
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        field = 'email' if '@' in search_term else 'username'
+        return queryset.filter(**{field: search_term}), False
+
+    def formfield_for_manytomany(self, db_field, request, **kwargs):
+        if db_field.name == 'user_permissions':
+            kwargs['queryset'] = Permission.objects.select_related(
+                'content_type')
+        return super().formfield_for_manytomany(db_field, request, **kwargs)
 
     def save_model(self, request, obj, form, change):
         if 'password' in form.changed_data:
             obj.set_password(form.cleaned_data['password'])
         super().save_model(request, obj, form, change)
 
-    def block_user(self, request, queryset):
-        for user in queryset:
-            user.is_blocked = True
-            user.save()
+    def block_users(self, request, queryset):
+        changed = set_blocked(queryset, blocked=True)
+        self.message_user(request, f'Заблокировано пользователей: {changed}')
 
-    actions = [block_user]
+    def unblock_users(self, request, queryset):
+        changed = set_blocked(queryset, blocked=False)
+        self.message_user(request,
+                          f'Разблокировано пользователей: {changed}')
+
+    actions = [block_users, unblock_users]
+    block_users.short_description = 'Заблокировать и отозвать токены'
+    unblock_users.short_description = 'Разблокировать'
     total_subscribers.short_description = 'Кол-во подписчиков:'
     total_recipes.short_description = 'Кол-во рецептов:'
+    total_subscribers.admin_order_field = 'subscribers_count'
+    total_recipes.admin_order_field = 'recipes_count'
@@ -0,0 +1,23 @@
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+from .models import MyUser
+from .signals import auth_revoked
+
+
+def set_blocked(users, blocked=True):
+    # Один UPDATE на всех пользователей и одно удаление их токенов,
+    # чтобы блокировка тысяч аккаунтов срабатывала сразу. UPDATE и
+    # удаление получают выборку подзапросом; в Python загружаются только
+    # id и ключи токенов, которые нужны для сброса кешей после коммита.
+    user_ids = users.values('id')
+    with transaction.atomic():
+        if blocked:
+            revoked_ids = list(users.values_list('id', flat=True))
+            tokens = Token.objects.filter(user_id__in=user_ids)
+            token_keys = list(tokens.values_list('key', flat=True))
+            tokens.delete()
+            transaction.on_commit(lambda: auth_revoked.send(
+                sender=MyUser, token_keys=token_keys, user_ids=revoked_ids))
+        return MyUser.objects.filter(id__in=user_ids).exclude(
+            is_blocked=blocked).update(is_blocked=blocked)
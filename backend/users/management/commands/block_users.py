@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from users.blocking import set_blocked
+from users.models import MyUser
+
+BATCH_SIZE = 500
+# Id передается с префиксом: имя пользователя может состоять из цифр.
+ID_PREFIX = 'id:'
+
+
+class Command(BaseCommand):
+    help = "Block or unblock users by email, username or id and revoke tokens"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'users', nargs='*',
+            help=f'Email, имя пользователя или {ID_PREFIX}<id>'
+        )
+        parser.add_argument(
+            '--file',
+            help='Файл со списком пользователей, по одному в строке'
+        )
+        parser.add_argument(
+            '--unblock', action='store_true',
+            help='Разблокировать вместо блокировки'
+        )
+
+    def handle(self, *args, **options):
+        identifiers = set(options['users'])
+        if options['file']:
+            with open(options['file'], 'r', encoding='utf-8') as file:
+                identifiers.update(line.strip() for line in file)
+        identifiers.discard('')
+        if not identifiers:
+            raise CommandError('Не указаны пользователи.')
+        invalid = [value for value in identifiers
+                   if value.startswith(ID_PREFIX)
+                   and not value.removeprefix(ID_PREFIX).isdigit()]
+        if invalid:
+            raise CommandError(f'Неверный id: {", ".join(sorted(invalid))}.')
+        identifiers = sorted(identifiers)
+        changed = 0
+        # Пачками, чтобы не упереться в лимит параметров запроса SQLite.
+        for start in range(0, len(identifiers), BATCH_SIZE):
+            batch = identifiers[start:start + BATCH_SIZE]
+            names = [value for value in batch
+                     if not value.startswith(ID_PREFIX)]
+            ids = [value.removeprefix(ID_PREFIX) for value in batch
+                   if value.startswith(ID_PREFIX)]
+            users = MyUser.objects.filter(
+                Q(email__in=names) | Q(username__in=names) | Q(id__in=ids)
+            )
+            changed += set_blocked(users, blocked=not options['unblock'])
+        action = 'Разблокировано' if options['unblock'] else 'Заблокировано'
+        self.stdout.write(f"[!] {action} пользователей: {changed}.")
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+
+from recipes.counters import recount_field
+
+
+def count_subscribers(apps, schema_editor):
+    recount_field(apps.get_model('users', 'MyUser'), 'subscribers_count',
+                  apps.get_model('users', 'Subscription'), 'author')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0012_alter_myuser_options_alter_subscription_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='myuser',
+            name='recipes_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Кол-во рецептов'),
+        ),
+        migrations.AddField(
+            model_name='myuser',
+            name='subscribers_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Кол-во подписчиков'),
+        ),
+        migrations.RunPython(count_subscribers, migrations.RunPython.noop),
+    ]
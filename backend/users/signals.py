@@ -0,0 +1,21 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from recipes.counters import change_counter
+from .models import MyUser, Subscription
+
+# Отправляется после коммита, когда у пользователей отозваны токены:
+# token_keys нужны для сброса закешированной авторизации, user_ids - для
+# отзыва JWT.
+auth_revoked = Signal()
+
+
+@receiver(post_save, sender=Subscription)
+def increase_subscribers_count(sender, instance, created, **kwargs):
+    if created:
+        change_counter(MyUser, instance.author_id, 'subscribers_count', 1)
+
+
+@receiver(post_delete, sender=Subscription)
+def decrease_subscribers_count(sender, instance, **kwargs):
+    change_counter(MyUser, instance.author_id, 'subscribers_count', -1)